@@ -0,0 +1,49 @@
+import sys
+import logging
+from collections import deque
+from logging.handlers import RotatingFileHandler
+LOGGER_NAME = 'hear_your_key'
+class RingHandler(logging.Handler):
+    def __init__(self, capacity=5000, level=logging.INFO):
+        super().__init__(level)
+        self.capacity = capacity
+        self.records = deque(maxlen=capacity)
+        self.received = 0
+        self.setFormatter(logging.Formatter('%(message)s'))
+    def handle(self, record):
+        if not self.filter(record):
+            return False
+        self.records.append(record)
+        self.received += 1
+        return True
+    def emit(self, record):
+        self.records.append(record)
+    def drain(self, limit=None):
+        records = []
+        while self.records and (limit is None or len(records) < limit):
+            try:
+                records.append(self.records.popleft())
+            except IndexError:
+                break
+        return records
+def get_logger(name=None):
+    return logging.getLogger(LOGGER_NAME if name is None else f'{LOGGER_NAME}.{name}')
+def setup_logging(level='INFO', capacity=5000, log_file=None, max_bytes=1 << 20, backup_count=3, console_level='WARNING'):
+    logger = get_logger()
+    logger.setLevel(level)
+    logger.propagate = False
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+        handler.close()
+    ring = RingHandler(capacity, level)
+    logger.addHandler(ring)
+    console = logging.StreamHandler(sys.stderr)
+    console.setLevel(console_level)
+    console.setFormatter(logging.Formatter('%(levelname)s %(name)s: %(message)s'))
+    logger.addHandler(console)
+    if log_file:
+        file_handler = RotatingFileHandler(log_file, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8')
+        file_handler.setLevel(level)
+        file_handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s'))
+        logger.addHandler(file_handler)
+    return ring
@@ -1,36 +1,54 @@
-import pyaudio
-import numpy as np
 import threading
 import time
-from queue import Queue
+from queue import Queue, Full
+from segmenter import KeySegmenter, OnsetDetector
+from audio_source import PyAudioSource
+from resampler import PolyphaseResampler
+from app_logging import get_logger
+logger = get_logger('recorder')
 class AudioRecorder:
-    def __init__(self, callback=None, rate=44100, chunk_size=1024, channels=1, device_index=None):
-        self.rate = rate
-        self.chunk_size = chunk_size
-        self.channels = channels
+    DETECTORS = ('onset', 'rms')
+    def __init__(self, callback=None, rate=44100, chunk_size=1024, channels=1, device_index=None, source=None, event_callback=None, stats=None, detector='onset', analysis_rate=None):
+        if source is None:
+            source = PyAudioSource(rate=rate, chunk_size=chunk_size, channels=channels, device_index=device_index)
+        self.source = source
+        self.capture_rate = source.rate
+        self.rate = analysis_rate or source.rate
+        self.resampler = PolyphaseResampler(self.capture_rate, self.rate) if self.rate != self.capture_rate else None
+        self.chunk_size = source.chunk_size
+        self.channels = source.channels
         self.device_index = device_index
-        self.p = pyaudio.PyAudio()
-        self.stream = None
         self.is_recording = False
         self.callback = callback
+        self.event_callback = event_callback
+        self.stats = stats
         self.audio_queue = Queue()
         self.threshold = 0.02
         self.silence_timeout = 0.3
+        if detector == 'onset':
+            self.segmenter = OnsetDetector(rate=self.rate)
+        else:
+            self.segmenter = KeySegmenter(rate=self.rate, threshold=self.threshold, silence_timeout=self.silence_timeout)
+        self.threshold = self.segmenter.threshold
+        self.finished = threading.Event()
         self.recording_thread = None
         self.processing_thread = None
+        self.pending_switch = None
+        self.last_switch_latency = None
+    @property
+    def dropped_frames(self):
+        return getattr(self.source, 'dropped_frames', 0)
     def start_recording(self):
         if self.is_recording:
             return
         self.is_recording = True
+        self.audio_queue = Queue(maxsize=0 if self.source.realtime else 64)
+        self.segmenter.reset()
+        if self.resampler is not None:
+            self.resampler.reset()
+        self.finished.clear()
         try:
-            self.stream = self.p.open(
-                format=pyaudio.paFloat32,
-                channels=self.channels,
-                rate=self.rate,
-                input=True,
-                input_device_index=self.device_index,
-                frames_per_buffer=self.chunk_size
-            )
+            self.source.open()
             self.recording_thread = threading.Thread(target=self._record)
             self.recording_thread.daemon = True
             self.recording_thread.start()
@@ -38,58 +56,105 @@ class AudioRecorder:
             self.processing_thread.daemon = True
             self.processing_thread.start()
         except Exception as e:
-            print(f"录音错误: {e}")
+            logger.error("录音错误: %s", e)
             self.is_recording = False
-    def stop_recording(self):
+            self.finished.set()
+    def stop_recording(self, timeout=2.0):
         self.is_recording = False
-        if self.stream:
-            self.stream.stop_stream()
-            self.stream.close()
-            self.stream = None
+        current = threading.current_thread()
+        if self.recording_thread is not None and self.recording_thread is not current:
+            self.recording_thread.join(timeout)
+        self.source.close()
+        try:
+            self.audio_queue.put_nowait(None)
+        except Full:
+            pass
+        if self.processing_thread is not None and self.processing_thread is not current:
+            self.processing_thread.join(timeout)
+    def switch_device(self, device_index):
+        if not hasattr(self.source, 'switch_device'):
+            raise ValueError("当前音频源不支持切换设备")
+        if not self.is_recording:
+            self.source.device_index = device_index
+            self.device_index = device_index
+            self.pending_switch = (self.source.generation, time.perf_counter())
+            self.start_recording()
+            if not self.is_recording:
+                self.pending_switch = None
+                raise OSError("无法打开输入设备")
+            return
+        self.pending_switch = (self.source.generation + 1, time.perf_counter())
+        try:
+            self.source.switch_device(device_index)
+        except Exception:
+            self.pending_switch = None
+            raise
+        self.device_index = device_index
+    def wait(self, timeout=None):
+        return self.finished.wait(timeout)
     def _record(self):
         while self.is_recording:
             try:
-                data = self.stream.read(self.chunk_size)
-                audio_data = np.frombuffer(data, dtype=np.float32)
-                self.audio_queue.put(audio_data)
-                if self.callback:
-                    self.callback(audio_data)
+                audio_data = self.source.read()
+                if audio_data is None:
+                    self._put(None)
+                    break
+                captured_at = time.perf_counter()
+                if self.pending_switch is not None and self.source.read_generation >= self.pending_switch[0]:
+                    self._switched(captured_at - self.pending_switch[1])
+                self._put((audio_data, captured_at))
             except Exception as e:
-                print(f"录音错误: {e}")
+                if not self.is_recording:
+                    break
+                logger.error("录音错误: %s", e)
                 time.sleep(0.1)
+    def _put(self, item):
+        while True:
+            try:
+                self.audio_queue.put(item, timeout=0.1)
+                return
+            except Full:
+                if not self.is_recording:
+                    return
+    def _switched(self, latency):
+        self.pending_switch = None
+        self.last_switch_latency = latency
+        if self.stats is not None:
+            self.stats.record('device_switch', latency)
+        logger.info("输入设备切换完成，耗时 %.1f ms", latency * 1000)
     def _process_audio(self):
-        is_key_pressed = False
-        key_audio = []
-        last_sound_time = time.time()
-        silence_duration = 0
-        while self.is_recording:
-            if not self.audio_queue.empty():
-                audio_data = self.audio_queue.get()
-                rms = np.sqrt(np.mean(np.square(audio_data)))
-                if rms > self.threshold:
-                    last_sound_time = time.time()
-                    silence_duration = 0
-                    if not is_key_pressed:
-                        is_key_pressed = True
-                        key_audio = [audio_data]
-                        print(f"检测到可能的按键声音，音量: {rms:.6f}")
-                    else:
-                        key_audio.append(audio_data)
-                else:
-                    if is_key_pressed:
-                        silence_duration = time.time() - last_sound_time
-                        if silence_duration > self.silence_timeout:
-                            is_key_pressed = False
-                            if key_audio and len(key_audio) > 2:
-                                full_audio = np.concatenate(key_audio)
-                                print(f"按键事件结束，音频长度: {len(full_audio)}")
-                                if self.callback:
-                                    self.callback(full_audio, is_key_event=True)
-                            key_audio = []
-            else:
-                time.sleep(0.01)
+        try:
+            while self.is_recording:
+                item = self.audio_queue.get()
+                if item is None:
+                    if self.is_recording:
+                        self._emit(self.segmenter.flush(), time.perf_counter())
+                    break
+                audio_data, captured_at = item
+                if self.resampler is not None:
+                    audio_data = self.resampler.process(audio_data)
+                self._emit(self.segmenter.process(audio_data), captured_at)
+                if self.callback:
+                    self.callback(audio_data)
+        finally:
+            self.is_recording = False
+            self.finished.set()
+    def _emit(self, events, captured_at):
+        for event in events:
+            event.captured_at = captured_at
+            event.segmented_at = time.perf_counter()
+            if self.stats is not None:
+                self.stats.record('segment', event.segmented_at - captured_at)
+            logger.debug("按键事件结束，音频长度: %d", len(event.audio))
+            if self.event_callback:
+                self.event_callback(event)
+            elif self.callback:
+                self.callback(event.audio, is_key_event=True, event=event)
     def set_threshold(self, value):
         self.threshold = value
+        self.segmenter.threshold = value
+    def set_sensitivity(self, value):
+        self.segmenter.set_sensitivity(value)
+        self.threshold = self.segmenter.threshold
     def __del__(self):
-        self.stop_recording()
-        self.p.terminate()
\ No newline at end of file
+        self.stop_recording(timeout=0.5)
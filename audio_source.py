@@ -0,0 +1,190 @@
+import struct
+import time
+import threading
+import numpy as np
+WAV_FORMATS = {
+    (1, 8): ('u1', 1 / 128.0, 128),
+    (1, 16): ('<i2', 1 / 32768.0, 0),
+    (1, 32): ('<i4', 1 / 2147483648.0, 0),
+    (3, 32): ('<f4', 1.0, 0),
+    (3, 64): ('<f8', 1.0, 0),
+}
+class AudioSource:
+    realtime = True
+    def __init__(self, rate=44100, chunk_size=1024, channels=1):
+        self.rate = rate
+        self.chunk_size = chunk_size
+        self.channels = channels
+    def open(self):
+        pass
+    def read(self):
+        raise NotImplementedError
+    def close(self):
+        pass
+class AudioBackend:
+    _shared = None
+    _shared_lock = threading.Lock()
+    def __init__(self):
+        self.pa = None
+        self.lock = threading.Lock()
+        self.device_cache = None
+    @classmethod
+    def shared(cls):
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls()
+            return cls._shared
+    def _pyaudio(self):
+        if self.pa is None:
+            import pyaudio
+            self.pa = pyaudio.PyAudio()
+        return self.pa
+    def input_devices(self, refresh=False):
+        with self.lock:
+            if self.device_cache is None or refresh:
+                pa = self._pyaudio()
+                self.device_cache = []
+                for i in range(pa.get_device_count()):
+                    info = pa.get_device_info_by_index(i)
+                    if info['maxInputChannels'] > 0:
+                        self.device_cache.append((i, info['name']))
+            return list(self.device_cache)
+    def open_stream(self, rate, channels, chunk_size, device_index=None):
+        import pyaudio
+        with self.lock:
+            return self._pyaudio().open(
+                format=pyaudio.paFloat32,
+                channels=channels,
+                rate=rate,
+                input=True,
+                input_device_index=device_index,
+                frames_per_buffer=chunk_size
+            )
+    def terminate(self):
+        with self.lock:
+            if self.pa is not None:
+                self.pa.terminate()
+                self.pa = None
+            self.device_cache = None
+class PyAudioSource(AudioSource):
+    def __init__(self, rate=44100, chunk_size=1024, channels=1, device_index=None, backend=None):
+        super().__init__(rate, chunk_size, channels)
+        self.device_index = device_index
+        self.backend = backend or AudioBackend.shared()
+        self.stream = None
+        self.stream_lock = threading.Lock()
+        self.overflows = 0
+        self.dropped_frames = 0
+        self.generation = 0
+        self.read_generation = 0
+    def open(self):
+        self.stream = self.backend.open_stream(self.rate, self.channels, self.chunk_size, self.device_index)
+    def read(self):
+        import pyaudio
+        with self.stream_lock:
+            self.read_generation = self.generation
+            try:
+                data = self.stream.read(self.chunk_size)
+            except OSError as e:
+                if e.errno != pyaudio.paInputOverflowed:
+                    raise
+                self.overflows += 1
+                self.dropped_frames += self.chunk_size
+                data = self.stream.read(self.chunk_size, exception_on_overflow=False)
+        return np.frombuffer(data, dtype=np.float32)
+    def switch_device(self, device_index):
+        stream = self.backend.open_stream(self.rate, self.channels, self.chunk_size, device_index)
+        with self.stream_lock:
+            old, self.stream = self.stream, stream
+            self.device_index = device_index
+            self.generation += 1
+        if old is not None:
+            old.stop_stream()
+            old.close()
+        return self.generation
+    def close(self):
+        with self.stream_lock:
+            stream, self.stream = self.stream, None
+        if stream is not None:
+            stream.stop_stream()
+            stream.close()
+class FileSource(AudioSource):
+    def __init__(self, path, chunk_size=1024, realtime=False):
+        super().__init__(chunk_size=chunk_size)
+        self.path = str(path)
+        self.realtime = realtime
+        self.data = None
+        self.sound_file = None
+        self.scale = 1.0
+        self.offset = 0
+        self.position = 0
+        self.start_time = None
+        self._probe()
+    def _probe(self):
+        header = self._parse_wav()
+        if header is not None:
+            self.rate, self.channels, self.dtype, self.data_offset, self.frames = header
+            return
+        import soundfile as sf
+        info = sf.info(self.path)
+        self.rate, self.channels, self.dtype, self.frames = info.samplerate, info.channels, None, info.frames
+    def _parse_wav(self):
+        with open(self.path, 'rb') as f:
+            riff = f.read(12)
+            if len(riff) < 12 or riff[:4] != b'RIFF' or riff[8:12] != b'WAVE':
+                return None
+            fmt = None
+            while True:
+                chunk = f.read(8)
+                if len(chunk) < 8:
+                    return None
+                chunk_id, size = chunk[:4], struct.unpack('<I', chunk[4:])[0]
+                if chunk_id == b'fmt ':
+                    body = f.read(size)
+                    audio_format, channels, rate = struct.unpack('<HHI', body[:8])
+                    bits = struct.unpack('<H', body[14:16])[0]
+                    if audio_format == 0xFFFE and len(body) >= 26:
+                        audio_format = struct.unpack('<H', body[24:26])[0]
+                    fmt = (audio_format, channels, rate, bits)
+                elif chunk_id == b'data':
+                    if fmt is None or (fmt[0], fmt[3]) not in WAV_FORMATS:
+                        return None
+                    dtype, self.scale, self.offset = WAV_FORMATS[(fmt[0], fmt[3])]
+                    frames = size // (fmt[1] * np.dtype(dtype).itemsize)
+                    return fmt[2], fmt[1], dtype, f.tell(), frames
+                else:
+                    f.seek(size, 1)
+                if size % 2:
+                    f.seek(1, 1)
+    def open(self):
+        self.position = 0
+        self.start_time = time.perf_counter()
+        if self.dtype is not None:
+            self.data = np.memmap(self.path, dtype=self.dtype, mode='r', offset=self.data_offset, shape=(self.frames, self.channels))
+        else:
+            import soundfile as sf
+            self.sound_file = sf.SoundFile(self.path)
+    def read(self):
+        if self.data is not None:
+            frames = self.data[self.position:self.position + self.chunk_size]
+            if self.offset:
+                frames = frames.astype(np.float32) - self.offset
+        else:
+            frames = self.sound_file.read(self.chunk_size, dtype='float32', always_2d=True)
+        if len(frames) == 0:
+            return None
+        self.position += len(frames)
+        audio_data = frames[:, 0] if self.channels == 1 else frames.mean(axis=1)
+        audio_data = audio_data.astype(np.float32)
+        if self.scale != 1.0:
+            audio_data *= self.scale
+        if self.realtime:
+            delay = self.start_time + self.position / self.rate - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        return audio_data
+    def close(self):
+        self.data = None
+        if self.sound_file is not None:
+            self.sound_file.close()
+            self.sound_file = None
@@ -0,0 +1,384 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+import contextlib
+import tracemalloc
+import io
+import numpy as np
+RATE = 44100
+def synth_keystroke(key_id, rng, rate=RATE, duration=0.12):
+    n = int(duration * rate)
+    t = np.arange(n) / rate
+    base = 800 + 350 * key_id
+    tone = np.sin(2 * np.pi * base * t) + 0.5 * np.sin(2 * np.pi * (2.7 * base + 90 * (key_id % 3)) * t)
+    click = rng.normal(0, 1, n) * np.exp(-t * 400)
+    envelope = np.exp(-t * (35 + 4 * (key_id % 5)))
+    gain = rng.uniform(0.15, 0.35)
+    return (gain * envelope * (0.6 * tone + 0.4 * click) + rng.normal(0, 0.002, n)).astype(np.float32)
+def synth_dataset(n_classes, per_class, seed=0, rate=RATE):
+    rng = np.random.default_rng(seed)
+    clips, labels = [], []
+    for i in range(per_class):
+        for key_id in range(n_classes):
+            clips.append(synth_keystroke(key_id, rng, rate))
+            labels.append(f'k{key_id}')
+    return clips, np.array(labels)
+def synth_stream(duration, keys_per_second=4, seed=0, rate=RATE, n_classes=10):
+    rng = np.random.default_rng(seed)
+    audio = rng.normal(0, 0.002, int(duration * rate)).astype(np.float32)
+    onsets = []
+    t = 0.2
+    while t < duration - 0.3:
+        key_id = int(rng.integers(n_classes))
+        clip = synth_keystroke(key_id, rng, rate)
+        start = int(t * rate)
+        audio[start:start + len(clip)] += clip
+        onsets.append(start)
+        t += rng.uniform(0.6, 1.4) / keys_per_second
+    return audio, np.array(onsets)
+def timed(fn, repeat=5):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return float(np.median(times))
+def quiet():
+    return contextlib.redirect_stdout(io.StringIO())
+def _recall(detected, expected, tolerance):
+    if not len(detected) or not len(expected):
+        return 0.0
+    nearest = np.abs(np.asarray(detected)[None, :] - np.asarray(expected)[:, None]).min(axis=1)
+    return float(np.mean(nearest <= tolerance))
+def bench_segmenter(quick):
+    from segmenter import KeySegmenter, OnsetDetector
+    duration = 20 if quick else 120
+    results = {}
+    for keys_per_second in (4, 12):
+        audio, onsets = synth_stream(duration, keys_per_second=keys_per_second)
+        chunks = [audio[i:i + 1024] for i in range(0, len(audio), 1024)]
+        for name, factory in (('rms', lambda: KeySegmenter(rate=RATE)), ('onset', lambda: OnsetDetector(rate=RATE))):
+            segmenter = factory()
+            events = []
+            base = []
+            def run():
+                segmenter.reset()
+                events.clear()
+                base[:] = [segmenter.ring.total]
+                with quiet():
+                    for chunk in chunks:
+                        events.extend(segmenter.process(chunk))
+                    events.extend(segmenter.flush())
+            seconds = timed(run, 3)
+            detected = [event.onset - base[0] + segmenter.pre_roll for event in events]
+            results[f'{name}_{keys_per_second}ps_us_per_chunk'] = seconds / len(chunks) * 1e6
+            results[f'{name}_{keys_per_second}ps_recall'] = _recall(detected, onsets, int(0.02 * RATE))
+            results[f'events_{name}_{keys_per_second}ps'] = len(events)
+        results[f'events_expected_{keys_per_second}ps'] = len(onsets)
+    return results
+def bench_features(quick):
+    from feature_extractor import FeatureExtractor
+    clips, _ = synth_dataset(10, 20 if quick else 100)
+    extractor = FeatureExtractor(sr=RATE)
+    reference = FeatureExtractor(sr=RATE, fused=False)
+    extractor.extract_features(clips[0])
+    reference.extract_features(clips[0])
+    subset = clips[:50]
+    results = {
+        'single_ms': timed(lambda: [extractor.extract_features(c) for c in subset], 3) / len(subset) * 1000,
+        'single_librosa_ms': timed(lambda: [reference.extract_features(c) for c in subset], 3) / len(subset) * 1000,
+        'batch_ms_per_event': timed(lambda: extractor.extract_features_batch(clips), 3) / len(clips) * 1000,
+        'n_events': len(clips)
+    }
+    rng = np.random.default_rng(1)
+    for name, low, high, n in (('short', 0.05, 0.5, 400), ('long', 0.5, 2.0, 60)):
+        mixed = [synth_keystroke(i % 10, rng, duration=d) for i, d in enumerate(rng.uniform(low, high, n // 4 if quick else n))]
+        tracemalloc.start()
+        extractor.extract_features_batch(mixed)
+        results[f'mixed_{name}_batch_peak_mb'] = tracemalloc.get_traced_memory()[1] / 2 ** 20
+        tracemalloc.stop()
+        results[f'mixed_{name}_loop_ms_per_event'] = timed(lambda: [extractor.extract_features_batch([c]) for c in mixed], 3) / len(mixed) * 1000
+        results[f'mixed_{name}_batch_ms_per_event'] = timed(lambda: extractor.extract_features_batch(mixed), 3) / len(mixed) * 1000
+    return results
+def bench_feature_cache(quick, workdir):
+    from feature_extractor import FeatureExtractor
+    from feature_cache import FeatureCache
+    clips, _ = synth_dataset(10, 20 if quick else 100)
+    path = os.path.join(workdir, 'feature_cache.sqlite')
+    def cold():
+        if os.path.exists(path):
+            os.remove(path)
+        cache = FeatureCache(path)
+        FeatureExtractor(sr=RATE, cache=cache).extract_features_batch(clips)
+        cache.close()
+    cold_s = timed(cold, 3)
+    cache = FeatureCache(path)
+    extractor = FeatureExtractor(sr=RATE, cache=cache)
+    warm_s = timed(lambda: extractor.extract_features_batch(clips), 3)
+    bounded = FeatureCache(os.path.join(workdir, 'feature_cache_small.sqlite'), max_entries=len(clips) // 2)
+    FeatureExtractor(sr=RATE, cache=bounded).extract_features_batch(clips)
+    result = {
+        'cold_ms_per_event': cold_s / len(clips) * 1000,
+        'warm_ms_per_event': warm_s / len(clips) * 1000,
+        'warm_hit_rate': cache.stats()['hit_rate'],
+        'n_evictions': bounded.stats()['evictions'],
+        'n_events': len(clips)
+    }
+    cache.close()
+    bounded.close()
+    return result
+def bench_sample_rate(quick):
+    from resampler import PolyphaseResampler
+    from segmenter import OnsetDetector
+    from feature_extractor import FeatureExtractor
+    from sklearn.ensemble import RandomForestClassifier
+    capture = 48000
+    duration = 10 if quick else 60
+    audio, _ = synth_stream(duration, keys_per_second=8, rate=capture)
+    chunks = [audio[i:i + 1024] for i in range(0, len(audio), 1024)]
+    train_clips, train_y = synth_dataset(10, 10 if quick else 30, seed=0, rate=capture)
+    test_clips, test_y = synth_dataset(10, 5 if quick else 15, seed=1, rate=capture)
+    results = {}
+    for rate in (48000, 22050, 16000):
+        resampler = PolyphaseResampler(capture, rate)
+        extractor = FeatureExtractor(sr=rate)
+        extractor.warm_up()
+        def run():
+            resampler.reset()
+            detector = OnsetDetector(rate=rate)
+            events = []
+            with quiet():
+                for chunk in chunks:
+                    events.extend(detector.process(resampler.process(chunk)))
+            if events:
+                extractor.extract_features_batch([event.audio for event in events])
+        def features(clips):
+            out = []
+            for clip in clips:
+                resampler.reset()
+                out.append(resampler.process(clip))
+            return extractor.extract_features_batch(out)
+        clf = RandomForestClassifier(n_estimators=100, random_state=42, n_jobs=-1).fit(features(train_clips), train_y)
+        results[f'{rate}hz_cpu_ms_per_audio_s'] = timed(run, 3) / duration * 1000
+        results[f'{rate}hz_accuracy'] = float(np.mean(clf.predict(features(test_clips)) == test_y))
+    return results
+def _feature_matrix(n_classes, per_class, seed=0):
+    from feature_extractor import FeatureExtractor
+    clips, labels = synth_dataset(n_classes, per_class, seed)
+    return FeatureExtractor(sr=RATE).extract_features_batch(clips), labels
+def bench_training(quick, workdir):
+    from model import KeyboardModel
+    from feature_extractor import vector_to_features
+    results = {}
+    grid = [(10, 10), (30, 10)] if quick else [(10, 10), (10, 50), (30, 20), (30, 100)]
+    for n_classes, per_class in grid:
+        X, y = _feature_matrix(n_classes, per_class)
+        name = f'{n_classes}keys_{per_class}per'
+        def full():
+            path = os.path.join(workdir, 'train', 'keyboard_model.pkl')
+            shutil.rmtree(os.path.dirname(path), ignore_errors=True)
+            with quiet():
+                model = KeyboardModel(path)
+                for key, row in zip(y, X):
+                    model.add_sample(key, vector_to_features(row))
+                model.train(full=True)
+            return model
+        results[f'full_fit_s_{name}'] = timed(full, 3)
+        model = full()
+        extra = [vector_to_features(row) for row in X[:5]]
+        def incremental():
+            for key, features in zip(y[:5], extra):
+                model.add_sample(key, features)
+            with quiet():
+                model.train(full=False)
+        results[f'incremental_fit_s_{name}'] = timed(incremental, 3)
+    return results
+def bench_prediction(quick, workdir):
+    from model import KeyboardModel
+    from feature_extractor import vector_to_features
+    X, y = _feature_matrix(30, 10 if quick else 30)
+    Xt, yt = _feature_matrix(30, 5, seed=1)
+    path = os.path.join(workdir, 'predict', 'keyboard_model.pkl')
+    with quiet():
+        model = KeyboardModel(path)
+        for key, row in zip(y, X):
+            model.add_sample(key, vector_to_features(row))
+        model.train(full=True)
+        model.compact_model()
+    samples = [vector_to_features(row) for row in Xt]
+    model.predict(samples[0])
+    latencies = []
+    for features in samples:
+        start = time.perf_counter()
+        model.predict(features)
+        latencies.append(time.perf_counter() - start)
+    labels, _ = model.predict_batch(Xt)
+    return {
+        'single_p50_ms': float(np.percentile(latencies, 50) * 1000),
+        'single_p99_ms': float(np.percentile(latencies, 99) * 1000),
+        'batch_ms_per_event': timed(lambda: model.predict_batch(Xt), 3) / len(Xt) * 1000,
+        'accuracy': float(np.mean(labels == yt))
+    }
+def bench_compaction(quick, workdir):
+    from model import KeyboardModel
+    from forest_engine import ForestEngine
+    X, y = _feature_matrix(30, 20 if quick else 30)
+    Xt, yt = _feature_matrix(30, 5, seed=1)
+    path = os.path.join(workdir, 'compaction', 'keyboard_model.pkl')
+    shutil.rmtree(os.path.dirname(path), ignore_errors=True)
+    with quiet():
+        model = KeyboardModel(path)
+        model.add_samples(y, X)
+        start = time.perf_counter()
+        model.train(full=True)
+        train_s = time.perf_counter() - start
+        report = model.compact_model()
+        compact_s = time.perf_counter() - start - train_s
+    if report is None:
+        return {'train_s': train_s}
+    before = ForestEngine.from_sklearn(model.model)
+    results = {
+        'train_s': train_s,
+        'compact_s': compact_s,
+        'n_estimators': report['chosen']['n_estimators'],
+        'n_nodes_before': before.n_nodes,
+        'n_nodes_after': model.engine.n_nodes,
+        'file_bytes_before': report['before']['file_bytes'],
+        'file_bytes_after': report['after']['file_bytes'],
+        'load_ms_before': report['before']['load_ms'],
+        'load_ms_after': report['after']['load_ms'],
+        'predict_ms_before': timed(lambda: [before.predict_one(row) for row in Xt], 3) / len(Xt) * 1000,
+        'predict_ms_after': timed(lambda: [model.engine.predict_one(row) for row in Xt], 3) / len(Xt) * 1000,
+        'accuracy_before': float(np.mean(before.predict(Xt)[0] == yt)),
+        'accuracy_after': float(np.mean(model.engine.predict(Xt)[0] == yt))
+    }
+    model.add_samples(y[:5], X[:5])
+    with quiet():
+        results['incremental_fit_s'] = timed(lambda: model.train(full=False), 1)
+    results['n_trees_incremental'] = model.engine.n_trees
+    results['incremental_accuracy'] = float(np.mean(model.engine.predict(Xt)[0] == yt))
+    return results
+def bench_store(quick, workdir):
+    from sample_store import SampleStore
+    n = 2000 if quick else 20000
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(n, 18)).astype(np.float32)
+    directory = os.path.join(workdir, 'store')
+    def save():
+        shutil.rmtree(directory, ignore_errors=True)
+        store = SampleStore(directory)
+        for i, row in enumerate(X):
+            store.append(f'k{i % 30}', row, commit=False)
+        store.close()
+    def load():
+        store = SampleStore(directory)
+        np.asarray(store.get_features()).sum()
+        store.get_features('k3')
+        store.close()
+    save_s = timed(save, 3)
+    return {
+        'append_us_per_sample': save_s / n * 1e6,
+        'load_ms': timed(load, 5) * 1000,
+        'n_samples': n
+    }
+def _import_seconds(module):
+    code = f'import time; start = time.perf_counter(); import {module}; print(time.perf_counter() - start)'
+    out = subprocess.run([sys.executable, '-c', code], cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True)
+    return float(out.stdout.strip()) if out.returncode == 0 else None
+def bench_startup(quick):
+    results = {f'import_{m}_s': _import_seconds(m) for m in ('feature_extractor', 'model', 'cli')}
+    if _import_seconds('PyQt5.QtWidgets') is None:
+        return results
+    root = os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ, QT_QPA_PLATFORM='offscreen')
+    out = subprocess.run([sys.executable, os.path.join(root, 'main.py'), '--startup-timing'], cwd=root, env=env, capture_output=True, text=True, timeout=120)
+    for line in out.stdout.splitlines():
+        if line.startswith('{'):
+            results.update(json.loads(line))
+    return results
+BENCHMARKS = {
+    'segmenter': lambda quick, workdir: bench_segmenter(quick),
+    'features': lambda quick, workdir: bench_features(quick),
+    'feature_cache': bench_feature_cache,
+    'training': bench_training,
+    'prediction': bench_prediction,
+    'compaction': bench_compaction,
+    'store': bench_store,
+    'sample_rate': lambda quick, workdir: bench_sample_rate(quick),
+    'startup': lambda quick, workdir: bench_startup(quick),
+}
+HIGHER_IS_BETTER = ('_per_s', 'realtime_factor', 'accuracy', 'recall', 'hit_rate')
+INFORMATIONAL = ('n_', 'events_')
+def environment():
+    meta = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'processor': platform.processor(),
+        'cpu_count': os.cpu_count(),
+        'numpy': np.__version__,
+    }
+    for name in ('librosa', 'sklearn', 'scipy'):
+        try:
+            meta[name] = __import__(name).__version__
+        except ImportError:
+            meta[name] = None
+    try:
+        meta['git_commit'] = subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=os.path.dirname(os.path.abspath(__file__)), stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        meta['git_commit'] = None
+    return meta
+def compare(results, baseline, tolerance):
+    regressions = []
+    for section, metrics in results.items():
+        for metric, value in metrics.items():
+            old = baseline.get(section, {}).get(metric)
+            if old is None or value is None or metric.startswith(INFORMATIONAL) or not old:
+                continue
+            change = (value - old) / abs(old)
+            if metric.endswith(HIGHER_IS_BETTER):
+                change = -change
+            status = 'REGRESSION' if change > tolerance else 'ok'
+            print(f"{status:>10}  {section}.{metric}: {old:.4g} -> {value:.4g} ({change:+.1%})")
+            if status == 'REGRESSION':
+                regressions.append(f'{section}.{metric}')
+    return regressions
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='键盘声音识别性能基准测试（无需麦克风和界面）')
+    parser.add_argument('--only', nargs='*', choices=sorted(BENCHMARKS), help='只运行指定的基准')
+    parser.add_argument('--quick', action='store_true', help='使用较小的数据规模')
+    parser.add_argument('--output', help='结果 JSON 输出路径')
+    parser.add_argument('--compare', help='与基线 JSON 比较并标记性能回退')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='允许的相对退化比例')
+    args = parser.parse_args(argv)
+    workdir = tempfile.mkdtemp(prefix='hyk_bench_')
+    results = {}
+    try:
+        for name in args.only or BENCHMARKS:
+            start = time.perf_counter()
+            results[name] = BENCHMARKS[name](args.quick, workdir)
+            print(f"{name}: {time.perf_counter() - start:.1f}s {json.dumps(results[name], ensure_ascii=False)}", file=sys.stderr)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    report = {'environment': environment(), 'quick': args.quick, 'results': results}
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+    else:
+        print(json.dumps(report, indent=2, ensure_ascii=False))
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)['results']
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"发现性能回退: {', '.join(regressions)}", file=sys.stderr)
+            return 1
+    return 0
+if __name__ == '__main__':
+    sys.exit(main())
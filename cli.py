@@ -0,0 +1,173 @@
+import os
+import sys
+import json
+import argparse
+from pathlib import Path
+import numpy as np
+from audio_recorder import AudioRecorder
+from audio_source import FileSource
+from feature_extractor import FeatureExtractor
+from feature_cache import FeatureCache
+from model import KeyboardModel
+from model_compaction import compaction_summary
+AUDIO_SUFFIXES = ('.wav', '.flac', '.ogg')
+def target_rate(args, model):
+    return args.analysis_rate or model.sample_rate or model.model_rate
+def extract_events(path, args, rate=None):
+    events = []
+    recorder = AudioRecorder(source=FileSource(path), event_callback=events.append, detector=args.detector, analysis_rate=rate)
+    recorder.set_sensitivity(args.sensitivity)
+    if args.threshold is not None:
+        recorder.set_threshold(args.threshold)
+    recorder.start_recording()
+    recorder.wait()
+    recorder.stop_recording()
+    return events, recorder.rate
+def key_for_file(path, root):
+    path, root = Path(path), Path(root)
+    if path.parent != root:
+        return path.parent.name
+    return path.stem.split('_')[0]
+def make_extractor(args, rate):
+    cache = None if args.no_cache else FeatureCache(args.cache)
+    return FeatureExtractor(sr=rate, cache=cache)
+def report_cache(extractor):
+    if extractor.cache is not None:
+        stats = extractor.cache.stats()
+        print(f"特征缓存: 命中 {stats['hits']}，未命中 {stats['misses']}，条目 {stats['entries']}", file=sys.stderr)
+        extractor.cache.close()
+def load_audio_dir(args, rate=None):
+    audio_dir = args.audio_dir
+    keys, clips, rates = [], [], set()
+    for path in sorted(Path(audio_dir).rglob('*')):
+        if path.suffix.lower() not in AUDIO_SUFFIXES:
+            continue
+        events, event_rate = extract_events(path, args, rate)
+        rates.add(event_rate)
+        key = key_for_file(path, audio_dir)
+        keys.extend([key] * len(events))
+        clips.extend(event.audio for event in events)
+        print(f"{path}: {len(events)} 个按键事件 -> '{key}'", file=sys.stderr)
+    if len(rates) > 1:
+        raise ValueError(f"音频文件采样率不一致: {sorted(rates)}，请用 --analysis-rate 统一重采样")
+    rate = rates.pop() if rates else rate or 44100
+    extractor = make_extractor(args, rate)
+    X = extractor.extract_features_batch(clips)
+    report_cache(extractor)
+    return np.array(keys), X, rate
+def load_store(data_dir):
+    from data_manager import DataManager
+    X, y = DataManager(data_dir).get_training_data()
+    return np.asarray(y, dtype=str), np.asarray(X, dtype=np.float32)
+def load_samples(args, model):
+    batches = []
+    if args.audio_dir:
+        keys, X, model.sample_rate = load_audio_dir(args, target_rate(args, model))
+        batches.append((keys, X))
+    if args.store:
+        batches.append(load_store(args.store))
+    return batches
+def cmd_train(args):
+    model = KeyboardModel(args.model, sample_rate=args.analysis_rate, compact=not args.no_compact, max_accuracy_loss=args.max_accuracy_loss)
+    batches = load_samples(args, model)
+    if not args.append:
+        model.clear_samples()
+    for keys, X in batches:
+        model.add_samples(keys, X)
+    if not model.train(full=args.full or not args.append or None):
+        print("训练失败，没有足够的样本")
+        return 1
+    counts = model.get_sample_count()
+    print(f"模型训练完成（{model.last_train_mode}），{len(counts)} 个按键，{sum(counts.values())} 个样本 -> {args.model}")
+    if model.pending_compaction is not None:
+        report = model.compact_model()
+        print(compaction_summary(report) if report else "留出样本不足，跳过模型压缩，保留完整随机森林")
+    return 0
+def cmd_evaluate(args):
+    model = KeyboardModel(args.model, sample_rate=args.analysis_rate)
+    if args.audio_dir and not args.cv:
+        if not model.is_trained:
+            print("模型尚未训练")
+            return 1
+        keys, X, rate = load_audio_dir(args, target_rate(args, model))
+        labels, confidence = model.predict_batch(X, sample_rate=rate)
+        report = {
+            'n_events': int(len(keys)),
+            'accuracy': float(np.mean(labels == keys)) if len(keys) else 0.0,
+            'mean_confidence': float(np.mean(confidence)) if len(keys) else 0.0,
+            'per_key_accuracy': {str(k): float(np.mean(labels[keys == k] == k)) for k in np.unique(keys)}
+        }
+    else:
+        batches = load_samples(args, model)
+        if batches:
+            model.clear_samples()
+        for keys, X in batches:
+            model.add_samples(keys, X)
+        grid = json.loads(args.grid) if args.grid else {k: [v] for k, v in dict(model.forest_params, n_estimators=model.n_estimators).items()}
+        results = model.tune(grid, n_splits=args.folds, n_workers=args.workers, time_budget=args.budget, apply=args.apply)
+        report = {'configurations': results, 'best': results[0]['params'] if results else None}
+        if args.apply and model.pending_compaction is not None:
+            report['compaction'] = model.compact_model()
+            print(compaction_summary(report['compaction']) if report['compaction'] else "留出样本不足，跳过模型压缩，保留完整随机森林", file=sys.stderr)
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output)
+    else:
+        print(output)
+    return 0
+def cmd_recognize(args):
+    model = KeyboardModel(args.model, sample_rate=args.analysis_rate)
+    if not model.is_trained:
+        print("模型尚未训练")
+        return 1
+    events, rate = extract_events(args.audio, args, target_rate(args, model))
+    if not events:
+        return 0
+    extractor = make_extractor(args, rate)
+    X = extractor.extract_features_batch([event.audio for event in events])
+    report_cache(extractor)
+    labels, confidence = model.predict_batch(X, sample_rate=rate)
+    for event, key, conf in zip(events, labels, confidence):
+        print(f"{event.onset / rate:9.3f}s  {key}  ({conf:.2f})")
+    return 0
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='键盘声音识别命令行工具（无需界面和麦克风）')
+    parser.add_argument('--model', default=os.path.join('data', 'keyboard_model.pkl'), help='模型文件路径')
+    parser.add_argument('--analysis-rate', type=int, help='分析采样率（默认使用模型的训练采样率或音频文件原始采样率）')
+    parser.add_argument('--detector', choices=AudioRecorder.DETECTORS, default='onset', help='按键检测方式')
+    parser.add_argument('--sensitivity', type=int, default=50, help='灵敏度（0-100，与界面滑块一致）')
+    parser.add_argument('--threshold', type=float, help='覆盖最低音量阈值（RMS）')
+    parser.add_argument('--cache', default=os.path.join('data', 'feature_cache.sqlite'), help='特征缓存数据库路径')
+    parser.add_argument('--no-cache', action='store_true', help='不使用特征缓存')
+    sub = parser.add_subparsers(dest='command', required=True)
+    train = sub.add_parser('train', help='训练模型')
+    train.add_argument('--store', help='从样本库目录（DataManager 数据目录）读取样本')
+    train.add_argument('--audio-dir', help='从音频目录读取样本（<按键>/*.wav 或 <按键>_*.wav）')
+    train.add_argument('--append', action='store_true', help='追加到模型已保存的训练样本上（默认只用本次读取的样本重新训练）')
+    train.add_argument('--full', action='store_true', help='追加时强制完整重训练')
+    train.add_argument('--no-compact', action='store_true', help='不压缩模型（保留完整随机森林）')
+    train.add_argument('--max-accuracy-loss', type=float, default=0.01, help='压缩允许的最大验证准确率损失')
+    train.set_defaults(func=cmd_train)
+    evaluate = sub.add_parser('evaluate', help='评估模型或交叉验证')
+    evaluate.add_argument('--store', help='从样本库目录读取样本')
+    evaluate.add_argument('--audio-dir', help='在标注音频目录上评估已训练模型')
+    evaluate.add_argument('--cv', action='store_true', help='对音频目录样本做交叉验证而不是直接评估')
+    evaluate.add_argument('--folds', type=int, default=5, help='交叉验证折数')
+    evaluate.add_argument('--grid', help='参数网格 JSON，例如 {"n_estimators": [50, 100]}')
+    evaluate.add_argument('--budget', type=float, help='搜索时间预算（秒）')
+    evaluate.add_argument('--workers', type=int, help='工作进程数（默认全部核心）')
+    evaluate.add_argument('--apply', action='store_true', help='用最佳配置重新训练并保存模型')
+    evaluate.add_argument('--output', help='结果 JSON 输出路径')
+    evaluate.set_defaults(func=cmd_evaluate)
+    recognize = sub.add_parser('recognize', help='识别音频文件中的按键')
+    recognize.add_argument('audio', help='WAV/FLAC 音频文件')
+    recognize.set_defaults(func=cmd_recognize)
+    args = parser.parse_args(argv)
+    try:
+        return args.func(args)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 1
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,49 +1,47 @@
-import pandas as pd
 import numpy as np
 from pathlib import Path
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Tuple
+from sample_store import SampleStore
+from feature_extractor import FEATURE_NAMES, features_to_vector, vector_to_features
 class DataManager:
     def __init__(self, data_dir: str = 'data'):
         self.data_dir = Path(data_dir)
         self.data_dir.mkdir(exist_ok=True)
         self.samples_file = self.data_dir / 'key_samples.json'
         self.features_dir = self.data_dir / 'features'
-        self.features_dir.mkdir(exist_ok=True)
-        self.samples_data = self._load_samples()
-    def _load_samples(self) -> pd.DataFrame:
+        self.store = SampleStore(self.data_dir / 'samples', n_features=len(FEATURE_NAMES))
         if self.samples_file.exists():
-            return pd.read_json(self.samples_file)
-        return pd.DataFrame(columns=['key', 'feature_file', 'timestamp'])
-    def save_sample(self, key: str, features: Dict[str, Any]) -> bool:
+            self.migrate_legacy_samples()
+    def migrate_legacy_samples(self) -> int:
+        import pandas as pd
+        legacy = pd.read_json(self.samples_file)
+        migrated = 0
+        for _, sample in legacy.iterrows():
+            feature_path = self.features_dir / sample['feature_file']
+            if not feature_path.exists():
+                continue
+            features = np.load(feature_path, allow_pickle=True).item()
+            timestamp = pd.Timestamp(sample['timestamp']).timestamp()
+            self.store.append(sample['key'], features_to_vector(features), timestamp=timestamp, commit=False)
+            migrated += 1
+        self.store.commit()
+        self.samples_file.rename(self.samples_file.with_name(self.samples_file.name + '.migrated'))
+        print(f'已迁移旧格式样本: {migrated}')
+        return migrated
+    def save_sample(self, key: str, features: Dict[str, Any], audio: Optional[np.ndarray] = None) -> bool:
         try:
-            feature_file = f'{key}_{pd.Timestamp.now().strftime("%Y%m%d_%H%M%S")}.npy'
-            feature_path = self.features_dir / feature_file
-            np.save(feature_path, features)
-            new_sample = pd.DataFrame([
-                {
-                    'key': key,
-                    'feature_file': str(feature_file),
-                    'timestamp': pd.Timestamp.now()
-                }
-            ])
-            self.samples_data = pd.concat([self.samples_data, new_sample], ignore_index=True)
-            self.samples_data.to_json(self.samples_file)
+            self.store.append(key, features_to_vector(features), audio=audio)
             return True
         except Exception as e:
             print(f'保存样本时出错: {e}')
             return False
     def get_samples_for_key(self, key: str) -> list:
-        key_samples = self.samples_data[self.samples_data['key'] == key]
-        features_list = []
-        for _, sample in key_samples.iterrows():
-            feature_path = self.features_dir / sample['feature_file']
-            if feature_path.exists():
-                features = np.load(feature_path, allow_pickle=True).item()
-                features_list.append(features)
-        return features_list
+        return [vector_to_features(row) for row in self.store.get_features(key)]
+    def get_feature_matrix(self, key: Optional[str] = None) -> np.ndarray:
+        return self.store.get_features(key)
+    def get_training_data(self) -> Tuple[np.ndarray, np.ndarray]:
+        return self.store.get_features(), self.store.get_labels()
     def get_all_keys(self) -> list:
-        return self.samples_data['key'].unique().tolist()
+        return self.store.keys()
     def get_sample_count(self, key: Optional[str] = None) -> int:
-        if key is not None:
-            return len(self.samples_data[self.samples_data['key'] == key])
-        return len(self.samples_data)
\ No newline at end of file
+        return self.store.count(key)
@@ -0,0 +1,97 @@
+import sqlite3
+import hashlib
+import threading
+import numpy as np
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+class FeatureCache:
+    VERSION = 1
+    def __init__(self, path: str = 'data/feature_cache.sqlite', max_entries: int = 200000):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS features (key BLOB PRIMARY KEY, config TEXT NOT NULL, vector BLOB NOT NULL, last_used INTEGER NOT NULL)')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS features_last_used ON features (last_used)')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT NOT NULL)')
+        row = self.conn.execute("SELECT value FROM meta WHERE name = 'version'").fetchone()
+        if row is None:
+            self.conn.execute("INSERT INTO meta VALUES ('version', ?)", (str(self.VERSION),))
+        elif int(row[0]) != self.VERSION:
+            raise ValueError(f"特征缓存版本不兼容: {row[0]}")
+        self.conn.commit()
+        self.clock = self.conn.execute('SELECT COALESCE(MAX(last_used), 0) FROM features').fetchone()[0]
+        self.size = self.conn.execute('SELECT COUNT(*) FROM features').fetchone()[0]
+        self.hits = 0
+        self.misses = 0
+        self.inserts = 0
+        self.evictions = 0
+    @staticmethod
+    def clip_key(clip: np.ndarray, config: str) -> bytes:
+        digest = hashlib.blake2b(config.encode('utf-8'), digest_size=16)
+        digest.update(np.ascontiguousarray(clip, dtype=np.float32).tobytes())
+        return digest.digest()
+    def get_many(self, keys: Sequence[bytes]) -> Dict[bytes, np.ndarray]:
+        found: Dict[bytes, np.ndarray] = {}
+        unique = list(dict.fromkeys(keys))
+        with self.lock:
+            for start in range(0, len(unique), 500):
+                chunk = unique[start:start + 500]
+                rows = self.conn.execute(f"SELECT key, vector FROM features WHERE key IN ({','.join('?' * len(chunk))})", chunk).fetchall()
+                for key, vector in rows:
+                    found[key] = np.frombuffer(vector, dtype=np.float32)
+            if found:
+                self.clock += 1
+                self.conn.executemany('UPDATE features SET last_used = ? WHERE key = ?', [(self.clock, key) for key in found])
+                self.conn.commit()
+            hits = sum(1 for key in keys if key in found)
+            self.hits += hits
+            self.misses += len(keys) - hits
+        return found
+    def put_many(self, items: Sequence[Tuple[bytes, np.ndarray]], config: str) -> None:
+        if not items:
+            return
+        with self.lock:
+            self.clock += 1
+            rows = [(key, config, np.ascontiguousarray(vector, dtype=np.float32).tobytes(), self.clock) for key, vector in items]
+            before = self.conn.total_changes
+            self.conn.executemany('INSERT OR REPLACE INTO features VALUES (?, ?, ?, ?)', rows)
+            self.size = self.conn.execute('SELECT COUNT(*) FROM features').fetchone()[0]
+            self.inserts += self.conn.total_changes - before
+            if self.size > self.max_entries:
+                excess = self.size - self.max_entries
+                self.conn.execute('DELETE FROM features WHERE key IN (SELECT key FROM features ORDER BY last_used LIMIT ?)', (excess,))
+                self.evictions += excess
+                self.size = self.max_entries
+            self.conn.commit()
+    def lookup(self, clips: Sequence[np.ndarray], config: str) -> Tuple[List[bytes], Dict[bytes, np.ndarray]]:
+        keys = [self.clip_key(clip, config) for clip in clips]
+        return keys, self.get_many(keys)
+    def purge(self, keep_config: Optional[str] = None) -> int:
+        with self.lock:
+            if keep_config is None:
+                removed = self.conn.execute('DELETE FROM features').rowcount
+            else:
+                removed = self.conn.execute('DELETE FROM features WHERE config != ?', (keep_config,)).rowcount
+            self.conn.commit()
+            self.size = self.conn.execute('SELECT COUNT(*) FROM features').fetchone()[0]
+        return removed
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            'entries': self.size,
+            'max_entries': self.max_entries,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'inserts': self.inserts,
+            'evictions': self.evictions
+        }
+    def __len__(self) -> int:
+        return self.size
+    def close(self) -> None:
+        with self.lock:
+            self.conn.close()
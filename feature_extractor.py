@@ -1,9 +1,66 @@
+import threading
 import numpy as np
-import librosa
+from functools import lru_cache
+from numpy.lib.stride_tricks import sliding_window_view
+FEATURE_VERSION = 1
+FFT_BLOCK = 8
+FEATURE_NAMES = tuple([f'mfcc_{i}' for i in range(13)] + ['spectral_centroid', 'spectral_bandwidth', 'spectral_rolloff', 'zero_crossing_rate', 'rms'])
+def features_to_vector(features):
+    return np.concatenate([np.asarray(features['mfcc'], dtype=np.float32).ravel(), np.array([
+        features['spectral_centroid'],
+        features['spectral_bandwidth'],
+        features['spectral_rolloff'],
+        features['zero_crossing_rate'],
+        features['rms']
+    ], dtype=np.float32)])
+def vector_to_features(vector):
+    n_mfcc = len(vector) - 5
+    return {
+        'mfcc': np.asarray(vector[:n_mfcc], dtype=np.float32),
+        'spectral_centroid': float(vector[n_mfcc]),
+        'spectral_bandwidth': float(vector[n_mfcc + 1]),
+        'spectral_rolloff': float(vector[n_mfcc + 2]),
+        'zero_crossing_rate': float(vector[n_mfcc + 3]),
+        'rms': float(vector[n_mfcc + 4])
+    }
+@lru_cache(maxsize=None)
+def _window(n_fft):
+    return (0.5 - 0.5 * np.cos(2 * np.pi * np.arange(n_fft) / n_fft)).astype(np.float32)
+@lru_cache(maxsize=None)
+def _mel_basis(sr, n_fft, n_mels):
+    import librosa
+    return np.ascontiguousarray(librosa.filters.mel(sr=sr, n_fft=n_fft, n_mels=n_mels).T)
+@lru_cache(maxsize=None)
+def _dct_matrix(n_mfcc, n_mels):
+    n = np.arange(n_mels)
+    basis = np.cos(np.pi / n_mels * (n + 0.5) * np.arange(n_mfcc)[:, None]) * np.sqrt(2.0 / n_mels)
+    basis[0] *= np.sqrt(0.5)
+    return np.ascontiguousarray(basis.T.astype(np.float32))
+@lru_cache(maxsize=None)
+def _fft_frequencies(sr, n_fft):
+    return np.fft.rfftfreq(n_fft, 1.0 / sr)
 class FeatureExtractor:
-    def __init__(self):
-        pass
+    def __init__(self, sr=44100, n_fft=2048, hop_length=512, n_mels=128, n_mfcc=13, fused=True, block_frames=128, cache=None):
+        self.sr = sr
+        self.n_fft = n_fft
+        self.hop_length = hop_length
+        self.n_mels = n_mels
+        self.n_mfcc = n_mfcc
+        self.fused = fused
+        self.block_frames = block_frames
+        self.cache = cache
+    def config_key(self):
+        return f'v{FEATURE_VERSION}:sr={self.sr}:n_fft={self.n_fft}:hop={self.hop_length}:n_mels={self.n_mels}:n_mfcc={self.n_mfcc}'
+    def warm_up(self):
+        _mel_basis(self.sr, self.n_fft, self.n_mels)
+        _dct_matrix(self.n_mfcc, self.n_mels)
+        _window(self.n_fft)
+    @property
+    def n_features(self):
+        return self.n_mfcc + 5
     def extract_features(self, audio_data):
+        if self.fused:
+            return self.extract_features_fused(audio_data)
         features = {}
         features['mfcc'] = self.get_mfcc(audio_data)
         features['spectral_centroid'] = self.get_spectral_centroid(audio_data)
@@ -12,28 +69,155 @@ class FeatureExtractor:
         features['zero_crossing_rate'] = self.get_zero_crossing_rate(audio_data)
         features['rms'] = self.get_rms(audio_data)
         return features
+    def extract_features_fused(self, audio_data):
+        return vector_to_features(self.extract_features_batch([audio_data])[0])
+    def extract_features_batch(self, clips, use_cache=True):
+        clips = [np.asarray(clip, dtype=np.float32).ravel() for clip in clips]
+        out = np.empty((len(clips), self.n_features), dtype=np.float32)
+        if self.cache is None or not use_cache:
+            missing = list(range(len(clips)))
+        else:
+            config = self.config_key()
+            keys, found = self.cache.lookup(clips, config)
+            missing = []
+            for i, key in enumerate(keys):
+                if key in found:
+                    out[i] = found[key]
+                else:
+                    missing.append(i)
+        for block in self._blocks([len(clips[i]) for i in missing]):
+            rows = [missing[i] for i in block]
+            out[rows] = self._extract_batch([clips[i] for i in rows])
+        if missing and self.cache is not None and use_cache:
+            self.cache.put_many(list({keys[i]: out[i] for i in missing}.items()), config)
+        return out
+    def _blocks(self, lengths):
+        block, frames = [], 0
+        for i in np.argsort(lengths, kind='stable'):
+            n = 1 + lengths[i] // self.hop_length
+            if block and frames + n > self.block_frames:
+                yield block
+                block, frames = [], 0
+            block.append(int(i))
+            frames += n
+        if block:
+            yield block
+    def _extract_batch(self, clips):
+        n_fft, hop, pad = self.n_fft, self.hop_length, self.n_fft // 2
+        lengths = np.array([len(clip) for clip in clips])
+        max_len = max(int(lengths.max()), 1)
+        in_clip = np.arange(max_len) < lengths[:, None]
+        y = np.zeros((len(clips), max_len), dtype=np.float32)
+        y[in_clip] = np.concatenate(clips)
+        n_frames = 1 + lengths // hop
+        starts = np.concatenate(([0], np.cumsum(n_frames)[:-1]))
+        frame_clip = np.repeat(np.arange(len(clips)), n_frames)
+        frame_index = np.arange(len(frame_clip)) - starts[frame_clip]
+        padded = np.zeros((len(clips), max_len + n_fft), dtype=np.float32)
+        padded[:, pad:pad + max_len] = y
+        frames = sliding_window_view(padded, n_fft, axis=1)[:, ::hop]
+        S = np.empty((len(frame_clip), n_fft // 2 + 1), dtype=np.float32)
+        window = _window(n_fft)
+        for start in range(0, len(frame_clip), FFT_BLOCK):
+            rows = slice(start, start + FFT_BLOCK)
+            S[rows] = np.abs(np.fft.rfft(frames[frame_clip[rows], frame_index[rows]] * window, axis=1))
+        freqs = _fft_frequencies(self.sr, n_fft)
+        mel = np.square(S) @ _mel_basis(self.sr, n_fft, self.n_mels)
+        log_mel = 10.0 * np.log10(np.maximum(mel, 1e-10))
+        top = np.maximum.reduceat(log_mel.max(axis=1), starts) - 80.0
+        log_mel = np.maximum(log_mel, top[frame_clip, None])
+        norm = S.sum(axis=1, keepdims=True)
+        S_norm = S / np.where(norm < np.finfo(S.dtype).tiny, 1, norm)
+        centroid = S_norm @ freqs
+        bandwidth = np.sqrt(np.sum(S_norm * np.square(freqs - centroid[:, None]), axis=1))
+        energy = np.cumsum(S, axis=1)
+        rolloff = freqs[np.argmax(energy >= 0.85 * energy[:, -1:], axis=1)]
+        signs = np.signbit(np.where(np.abs(y) <= 1e-10, 0, y))
+        crossings = np.zeros((len(clips), max_len), dtype=np.int32)
+        np.cumsum(signs[:, 1:] != signs[:, :-1], axis=1, out=crossings[:, 1:])
+        last = np.maximum(lengths - 1, 0)[frame_clip]
+        first = frame_index * hop - pad
+        zcr = (crossings[frame_clip, np.clip(first + n_fft - 1, 0, last)] - crossings[frame_clip, np.clip(first, 0, last)]) / n_fft
+        per_frame = np.column_stack([log_mel @ _dct_matrix(self.n_mfcc, self.n_mels), centroid, bandwidth, rolloff, zcr])
+        features = np.add.reduceat(per_frame, starts, axis=0) / n_frames[:, None]
+        rms = np.sqrt(np.sum(np.square(y), axis=1) / np.maximum(lengths, 1))
+        return np.column_stack([features, rms])
     def get_mfcc(self, audio_data):
-        mfccs = librosa.feature.mfcc(y=audio_data, sr=44100, n_mfcc=13)
+        import librosa
+        mfccs = librosa.feature.mfcc(y=audio_data, sr=self.sr, n_mfcc=self.n_mfcc, n_fft=self.n_fft, hop_length=self.hop_length, n_mels=self.n_mels)
         return np.mean(mfccs, axis=1)
     def get_spectral_centroid(self, audio_data):
-        spectral_centroids = librosa.feature.spectral_centroid(y=audio_data, sr=44100)[0]
+        import librosa
+        spectral_centroids = librosa.feature.spectral_centroid(y=audio_data, sr=self.sr, n_fft=self.n_fft, hop_length=self.hop_length)[0]
         return np.mean(spectral_centroids)
     def get_spectral_bandwidth(self, audio_data):
-        spectral_bandwidth = librosa.feature.spectral_bandwidth(y=audio_data, sr=44100)[0]
+        import librosa
+        spectral_bandwidth = librosa.feature.spectral_bandwidth(y=audio_data, sr=self.sr, n_fft=self.n_fft, hop_length=self.hop_length)[0]
         return np.mean(spectral_bandwidth)
     def get_spectral_rolloff(self, audio_data):
-        spectral_rolloff = librosa.feature.spectral_rolloff(y=audio_data, sr=44100)[0]
+        import librosa
+        spectral_rolloff = librosa.feature.spectral_rolloff(y=audio_data, sr=self.sr, n_fft=self.n_fft, hop_length=self.hop_length)[0]
         return np.mean(spectral_rolloff)
     def get_zero_crossing_rate(self, audio_data):
-        zcr = librosa.feature.zero_crossing_rate(audio_data)[0]
+        import librosa
+        zcr = librosa.feature.zero_crossing_rate(audio_data, frame_length=self.n_fft, hop_length=self.hop_length)[0]
         return np.mean(zcr)
     def get_rms(self, audio_data):
         return np.sqrt(np.mean(np.square(audio_data)))
     def get_spectrogram(self, audio_data):
+        import librosa
         n_fft = min(2048, len(audio_data))
         if n_fft < 32:
             n_fft = 32
         n_fft = 2 ** int(np.log2(n_fft))
         D = librosa.stft(audio_data, n_fft=n_fft)
         S_db = librosa.amplitude_to_db(np.abs(D), ref=np.max)
-        return S_db
\ No newline at end of file
+        return S_db
+class StreamingSpectrogram:
+    def __init__(self, n_fft=512, hop_length=256, n_frames=128, top_db=80.0):
+        self.n_fft = n_fft
+        self.hop_length = hop_length
+        self.n_frames = n_frames
+        self.n_bins = n_fft // 2 + 1
+        self.top_db = top_db
+        self.window = _window(n_fft)
+        self.ref = float(self.window.sum()) / 2
+        self.clim = (-top_db, 0.0)
+        self.ring = np.full((self.n_bins, n_frames), -top_db, dtype=np.float32)
+        self.out = np.empty_like(self.ring)
+        self.column = 0
+        self.staging = np.zeros(4 * n_fft, dtype=np.float32)
+        self.carry = 0
+        self.version = 0
+        self.lock = threading.Lock()
+    def push(self, audio_data):
+        audio_data = np.asarray(audio_data, dtype=np.float32)
+        total = self.carry + len(audio_data)
+        if total > len(self.staging):
+            staging = np.zeros(2 * total, dtype=np.float32)
+            staging[:self.carry] = self.staging[:self.carry]
+            self.staging = staging
+        self.staging[self.carry:total] = audio_data
+        if total < self.n_fft:
+            self.carry = total
+            return 0
+        n_new = 1 + (total - self.n_fft) // self.hop_length
+        frames = sliding_window_view(self.staging[:total], self.n_fft)[::self.hop_length][:n_new]
+        magnitude = np.abs(np.fft.rfft(frames[-self.n_frames:] * self.window, axis=1))
+        db = 20.0 * np.log10(np.maximum(magnitude / self.ref, 10 ** (-self.top_db / 20)))
+        np.minimum(db, 0.0, out=db)
+        columns = (self.column + np.arange(len(db))) % self.n_frames
+        with self.lock:
+            self.ring[:, columns] = db.T
+            self.column = int(columns[-1] + 1) % self.n_frames
+            self.version += 1
+        consumed = n_new * self.hop_length
+        self.carry = total - consumed
+        self.staging[:self.carry] = self.staging[consumed:total]
+        return n_new
+    def image(self):
+        with self.lock:
+            tail = self.n_frames - self.column
+            self.out[:, :tail] = self.ring[:, self.column:]
+            self.out[:, tail:] = self.ring[:, :self.column]
+        return self.out
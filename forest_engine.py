@@ -0,0 +1,154 @@
+import os
+import json
+import numpy as np
+ENGINE_FORMAT_VERSION = 1
+def float32_floor(values):
+    values = np.asarray(values, dtype=np.float64)
+    rounded = values.astype(np.float32)
+    return np.where(rounded > values, np.nextafter(rounded, np.float32(-np.inf)), rounded)
+class ForestEngine:
+    def __init__(self, feature, threshold, left, right, leaf_index, leaf_values, roots, classes, max_depth, n_features):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.leaf_index = leaf_index
+        self.leaf_values = leaf_values
+        self.roots = roots
+        self.classes = np.asarray(classes)
+        self.max_depth = int(max_depth)
+        self.n_features = int(n_features)
+        self.n_trees = len(roots)
+    @property
+    def n_nodes(self):
+        return len(self.feature)
+    @property
+    def nbytes(self):
+        return sum(a.nbytes for a in (self.feature, self.threshold, self.left, self.right, self.leaf_index, self.leaf_values, self.roots))
+    def save(self, path, meta=None):
+        header = dict(meta or {}, engine_format_version=ENGINE_FORMAT_VERSION, max_depth=self.max_depth, n_features=self.n_features)
+        tmp_path = path + '.tmp.npz'
+        np.savez(
+            tmp_path,
+            feature=self.feature,
+            threshold=self.threshold,
+            left=self.left,
+            right=self.right,
+            leaf_index=self.leaf_index,
+            leaf_values=self.leaf_values,
+            roots=self.roots,
+            classes=np.asarray([str(c) for c in self.classes]),
+            meta=np.array(json.dumps(header, ensure_ascii=False))
+        )
+        os.replace(tmp_path, path)
+    @staticmethod
+    def read_meta(path):
+        with np.load(path) as data:
+            return json.loads(str(data['meta']))
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            meta = json.loads(str(data['meta']))
+            if meta.get('engine_format_version') != ENGINE_FORMAT_VERSION:
+                raise ValueError(f"推理模型格式版本不匹配: {meta.get('engine_format_version')}")
+            engine = cls(
+                data['feature'],
+                data['threshold'],
+                data['left'],
+                data['right'],
+                data['leaf_index'],
+                data['leaf_values'],
+                data['roots'],
+                data['classes'],
+                meta['max_depth'],
+                meta['n_features']
+            )
+        return engine, meta
+    @classmethod
+    def from_sklearn(cls, forest):
+        features, thresholds, lefts, rights, leaf_indices, leaf_values, roots = [], [], [], [], [], [], []
+        offset = 0
+        n_leaves = 0
+        max_depth = 0
+        for estimator in forest.estimators_:
+            tree = estimator.tree_
+            n = tree.node_count
+            ids = np.arange(n)
+            is_leaf = tree.children_left == -1
+            features.append(np.where(is_leaf, 0, tree.feature).astype(np.int16))
+            thresholds.append(np.where(is_leaf, np.inf, float32_floor(tree.threshold)).astype(np.float32))
+            lefts.append((np.where(is_leaf, ids, tree.children_left) + offset).astype(np.int32))
+            rights.append((np.where(is_leaf, ids, tree.children_right) + offset).astype(np.int32))
+            leaf_index = np.full(n, -1, dtype=np.int32)
+            leaf_index[is_leaf] = np.arange(n_leaves, n_leaves + is_leaf.sum())
+            leaf_indices.append(leaf_index)
+            value = tree.value[is_leaf, 0, :]
+            leaf_values.append((value / value.sum(axis=1, keepdims=True)).astype(np.float32))
+            roots.append(offset)
+            offset += n
+            n_leaves += int(is_leaf.sum())
+            max_depth = max(max_depth, tree.max_depth)
+        return cls(
+            np.concatenate(features),
+            np.concatenate(thresholds),
+            np.concatenate(lefts),
+            np.concatenate(rights),
+            np.concatenate(leaf_indices),
+            np.concatenate(leaf_values),
+            np.array(roots, dtype=np.int32),
+            forest.classes_,
+            max_depth,
+            forest.n_features_in_
+        )
+    def rotate_trees(self, fresh):
+        if fresh.n_features != self.n_features or not np.array_equal(self.classes, fresh.classes):
+            raise ValueError("新增树的类别或特征与推理模型不一致")
+        k = fresh.n_trees
+        if k >= self.n_trees:
+            return fresh
+        start = int(self.roots[k])
+        kept = self.leaf_index[start:]
+        first_leaf = int(kept[kept >= 0].min())
+        n_nodes = self.n_nodes - start
+        n_leaves = len(self.leaf_values) - first_leaf
+        return ForestEngine(
+            np.concatenate([self.feature[start:], fresh.feature]),
+            np.concatenate([self.threshold[start:], fresh.threshold]),
+            np.concatenate([self.left[start:] - start, fresh.left + n_nodes]).astype(np.int32),
+            np.concatenate([self.right[start:] - start, fresh.right + n_nodes]).astype(np.int32),
+            np.concatenate([np.where(kept >= 0, kept - first_leaf, -1), np.where(fresh.leaf_index >= 0, fresh.leaf_index + n_leaves, -1)]).astype(np.int32),
+            np.concatenate([self.leaf_values[first_leaf:], fresh.leaf_values]),
+            np.concatenate([self.roots[k:] - start, fresh.roots + n_nodes]).astype(np.int32),
+            self.classes,
+            max(self.max_depth, fresh.max_depth),
+            self.n_features
+        )
+    def _leaves(self, X):
+        nodes = np.repeat(self.roots[:, None], len(X), axis=1)
+        flat = X.ravel()
+        row_offsets = np.arange(len(X)) * self.n_features
+        for _ in range(self.max_depth):
+            go_left = flat.take(row_offsets + self.feature.take(nodes)) <= self.threshold.take(nodes)
+            nodes = np.where(go_left, self.left.take(nodes), self.right.take(nodes))
+        return self.leaf_index[nodes]
+    def predict_proba(self, X, block_size=256):
+        X = np.ascontiguousarray(X, dtype=np.float32).reshape(-1, self.n_features)
+        proba = np.zeros((len(X), self.leaf_values.shape[1]))
+        for start in range(0, len(X), block_size):
+            block = proba[start:start + block_size]
+            for tree_leaves in self._leaves(X[start:start + block_size]):
+                block += self.leaf_values[tree_leaves]
+        return proba / self.n_trees
+    def predict(self, X):
+        proba = self.predict_proba(X)
+        best = np.argmax(proba, axis=1)
+        return self.classes.take(best), proba[np.arange(len(best)), best]
+    def predict_one(self, x):
+        x = np.asarray(x, dtype=np.float32).ravel()
+        nodes = self.roots
+        for _ in range(self.max_depth):
+            go_left = x.take(self.feature.take(nodes)) <= self.threshold.take(nodes)
+            nodes = np.where(go_left, self.left.take(nodes), self.right.take(nodes))
+        proba = np.add.reduce(self.leaf_values[self.leaf_index[nodes]], axis=0) / self.n_trees
+        best = int(np.argmax(proba))
+        return self.classes[best], float(proba[best])
@@ -0,0 +1,90 @@
+import threading
+import time
+from queue import Queue, Empty, Full
+from app_logging import get_logger
+logger = get_logger('inference')
+class InferenceStage:
+    POLICIES = ('drop_oldest', 'drop_newest', 'block')
+    def __init__(self, handler, on_result=None, workers=1, max_pending=8, policy='drop_oldest', block_timeout=1.0, stats=None):
+        if policy not in self.POLICIES:
+            raise ValueError(f"未知的丢弃策略: {policy}")
+        self.handler = handler
+        self.on_result = on_result
+        self.workers = workers
+        self.policy = policy
+        self.block_timeout = block_timeout
+        self.stats = stats
+        self.queue = Queue(maxsize=max_pending)
+        self.threads = []
+        self.submitted = 0
+        self.dropped = 0
+        self.completed = 0
+        self.failed = 0
+    def start(self):
+        if self.threads:
+            return
+        for _ in range(self.workers):
+            thread = threading.Thread(target=self._work)
+            thread.daemon = True
+            thread.start()
+            self.threads.append(thread)
+    def submit(self, item):
+        job = (item, time.perf_counter())
+        self.submitted += 1
+        if self.policy == 'block':
+            try:
+                self.queue.put(job, timeout=self.block_timeout)
+                return True
+            except Full:
+                self.dropped += 1
+                return False
+        while True:
+            try:
+                self.queue.put_nowait(job)
+                return True
+            except Full:
+                if self.policy == 'drop_newest':
+                    self.dropped += 1
+                    return False
+                try:
+                    self.queue.get_nowait()
+                    self.dropped += 1
+                except Empty:
+                    pass
+    def _work(self):
+        while True:
+            job = self.queue.get()
+            if job is None:
+                break
+            item, enqueued_at = job
+            started = time.perf_counter()
+            self._record('queue', started - enqueued_at)
+            try:
+                result = self.handler(item)
+                self._record('inference', time.perf_counter() - started)
+                if self.on_result:
+                    self.on_result(item, result)
+                self.completed += 1
+            except Exception as e:
+                self.failed += 1
+                logger.error("推理错误: %s", e)
+    def _record(self, stage, seconds):
+        if self.stats is not None:
+            self.stats.record(stage, seconds)
+    def pending(self):
+        return self.queue.qsize()
+    def stop(self, timeout=1.0):
+        for _ in self.threads:
+            while True:
+                try:
+                    self.queue.put(None, timeout=timeout)
+                    break
+                except Full:
+                    try:
+                        self.queue.get_nowait()
+                        self.dropped += 1
+                    except Empty:
+                        pass
+        for thread in self.threads:
+            thread.join(timeout)
+        self.threads = []
@@ -1,8 +1,13 @@
+import time
+_STARTED = time.perf_counter()
+import os
 import sys
+import json
+import argparse
+import threading
 import numpy as np
 from PyQt5.QtWidgets import QApplication, QMessageBox
 from PyQt5.QtCore import Qt, QTimer
-import pyaudio
 import matplotlib.pyplot as plt
 import matplotlib
 matplotlib.rcParams['font.sans-serif'] = ['SimHei', 'Microsoft YaHei', 'SimSun', 'Arial Unicode MS']
@@ -10,30 +15,86 @@ matplotlib.rcParams['axes.unicode_minus'] = False
 matplotlib.rcParams['font.family'] = 'sans-serif'
 from ui import MainWindow
 from audio_recorder import AudioRecorder
-from feature_extractor import FeatureExtractor
+from audio_source import FileSource, AudioBackend
+from segmenter import KeyEvent
+from inference import InferenceStage
+from metrics import LatencyStats
+from feature_extractor import FeatureExtractor, StreamingSpectrogram
 from model import KeyboardModel
+from model_compaction import compaction_summary
+from app_logging import get_logger, setup_logging
+logger = get_logger('app')
 class KeyboardSoundApp:
-    def __init__(self):
+    def __init__(self, source=None, workers=1, max_pending=8, drop_policy='drop_oldest', exit_after_startup=False, detector='onset', log_level='INFO', log_file=None, log_lines=1000, rate=44100, analysis_rate=None):
+        self.log_handler = setup_logging(log_level, log_file=log_file)
         self.app = QApplication(sys.argv)
         self.window = MainWindow()
-        self.feature_extractor = FeatureExtractor()
-        self.model = KeyboardModel()
+        self.window.attach_log(self.log_handler, max_lines=log_lines)
+        self.rate = source.rate if source is not None else rate
+        self.analysis_rate = analysis_rate or self.rate
+        self.feature_extractor = FeatureExtractor(sr=self.analysis_rate)
+        self.spectrogram = StreamingSpectrogram()
+        self.window.visualizer.set_spectrogram_source(self.spectrogram)
+        self.model = KeyboardModel(autoload=False, sample_rate=self.analysis_rate)
+        self.model_ready = threading.Event()
+        self.exit_after_startup = exit_after_startup
+        self.detector = detector
         self.recorder = None
+        self.source = source
+        self.stats = LatencyStats()
+        self.window.visualizer.set_stats(self.stats)
+        self.learn_mode = self.window.learn_mode_radio.isChecked()
+        self.window.key_result.connect(self.show_key_result)
+        self.inference = InferenceStage(
+            self.recognize_key,
+            on_result=self.window.key_result.emit,
+            workers=workers,
+            max_pending=max_pending,
+            policy=drop_policy,
+            stats=self.stats
+        )
+        self.inference.start()
+        self.window.show()
+        self.startup_times = {'window_shown_s': time.perf_counter() - _STARTED}
+        QTimer.singleShot(0, self.start_services)
+    def start_services(self):
         self.init_microphones()
         self.connect_signals()
         self.init_recorder()
+        self.startup_times['services_started_s'] = time.perf_counter() - _STARTED
+        threading.Thread(target=self.load_resources, daemon=True).start()
+        self.startup_timer = QTimer()
+        self.startup_timer.timeout.connect(self._check_startup_done)
+        self.startup_timer.start(10)
+    def load_resources(self):
+        try:
+            self.model.load_model()
+            self.feature_extractor.warm_up()
+        except Exception as e:
+            logger.error("加载模型或特征提取器失败: %s", e)
+        finally:
+            self.startup_times['ready_s'] = time.perf_counter() - _STARTED
+            self.model_ready.set()
+    def _check_startup_done(self):
+        if not self.model_ready.is_set():
+            return
+        self.startup_timer.stop()
         self.update_sample_count()
-        self.window.show()
+        if self.exit_after_startup:
+            print(json.dumps(self.startup_times))
+            self.app.quit()
     def init_microphones(self):
-        p = pyaudio.PyAudio()
         self.window.mic_combo.clear()
         self.window.mic_combo.addItem("默认麦克风", -1)
-        for i in range(p.get_device_count()):
-            device_info = p.get_device_info_by_index(i)
-            if device_info['maxInputChannels'] > 0:
-                name = device_info['name']
-                self.window.mic_combo.addItem(name, i)
-        p.terminate()
+        if self.source is not None:
+            return
+        try:
+            devices = AudioBackend.shared().input_devices()
+        except Exception as e:
+            logger.error("无法获取麦克风列表: %s", e)
+            return
+        for i, name in devices:
+            self.window.mic_combo.addItem(name, i)
     def connect_signals(self):
         self.window.learn_mode_radio.toggled.connect(self.toggle_mode)
         self.window.match_mode_radio.toggled.connect(self.toggle_mode)
@@ -42,35 +103,61 @@ class KeyboardSoundApp:
         self.window.add_sample_btn.clicked.connect(self.add_sample)
         self.window.train_model_btn.clicked.connect(self.train_model)
     def init_recorder(self):
-        self.recorder = AudioRecorder(callback=self.process_audio)
+        self.recorder = AudioRecorder(callback=self.process_audio, rate=self.rate, source=self.source, stats=self.stats, detector=self.detector, analysis_rate=self.analysis_rate)
+        self.recorder.set_sensitivity(self.window.sensitivity_slider.value())
         self.recorder.start_recording()
-    def process_audio(self, audio_data, is_key_event=False):
+    def process_audio(self, audio_data, is_key_event=False, event=None):
         try:
-            self.window.visualizer.update_waveform(audio_data)
-            if len(audio_data) > 512:
-                spec_data = self.feature_extractor.get_spectrogram(audio_data)
-                self.window.visualizer.update_spectrogram(spec_data)
+            if not is_key_event:
+                self.window.visualizer.update_waveform(audio_data)
+                self.spectrogram.push(audio_data)
+                if not self.window.visualizer.blit:
+                    self.window.visualizer.update_spectrogram(self.spectrogram.image())
             if is_key_event:
-                features = self.feature_extractor.extract_features(audio_data)
-                if self.window.learn_mode_radio.isChecked():
-                    self.window.log("检测到按键声音，请在输入框中输入对应的按键")
-                    self.current_features = features
-                else:
-                    if self.model.is_trained:
-                        key, confidence = self.model.predict(features)
-                        if key:
-                            self.window.update_result(key, confidence)
-                            self.window.log(f"检测到按键: {key} (置信度: {confidence:.2f})")
-                        else:
-                            self.window.update_result("未识别")
-                            self.window.log("无法识别按键")
-                    else:
-                            self.window.log("模型尚未训练，请先切换到学习模式训练模型")
+                if event is None:
+                    event = KeyEvent(audio_data, 0, len(audio_data), captured_at=time.perf_counter())
+                self.inference.submit((event, self.learn_mode))
         except Exception as e:
-            print(f"音频处理错误: {e}")
+            logger.error("音频处理错误: %s", e)
+    def recognize_key(self, job):
+        event, learn = job
+        started = time.perf_counter()
+        features = self.feature_extractor.extract_features(event.audio)
+        extracted = time.perf_counter()
+        self.stats.record('features', extracted - started)
+        result = {'features': features, 'learn': learn, 'key': None, 'confidence': 0, 'error': None}
+        if not result['learn'] and self.model.is_trained:
+            try:
+                result['key'], result['confidence'] = self.model.predict(features, sample_rate=self.analysis_rate)
+            except ValueError as e:
+                result['error'] = str(e)
+            self.stats.record('predict', time.perf_counter() - extracted)
+        return result
+    def show_key_result(self, job, result):
+        event = job[0]
+        started = time.perf_counter()
+        if result['learn']:
+            self.window.log("检测到按键声音，请在输入框中输入对应的按键")
+            self.current_features = result['features']
+        elif not self.model.is_trained:
+            self.window.log("模型尚未训练，请先切换到学习模式训练模型")
+        elif result['error']:
+            self.window.update_result("未识别")
+            self.window.log(result['error'])
+        elif result['key']:
+            self.window.update_result(result['key'], result['confidence'])
+            self.window.log(f"检测到按键: {result['key']} (置信度: {result['confidence']:.2f})")
+        else:
+            self.window.update_result("未识别")
+            self.window.log("无法识别按键")
+        finished = time.perf_counter()
+        self.stats.record('ui', finished - started)
+        if event.captured_at is not None:
+            self.stats.record('end_to_end', finished - event.captured_at)
     def toggle_mode(self, checked):
+        self.learn_mode = self.window.learn_mode_radio.isChecked()
         if checked:
-            if self.window.learn_mode_radio.isChecked():
+            if self.learn_mode:
                 self.window.log("切换到学习模式")
             else:
                 self.window.log("切换到匹配模式")
@@ -79,24 +166,32 @@ class KeyboardSoundApp:
     def change_microphone(self, index):
         device_id = self.window.mic_combo.itemData(index)
         self.window.log(f"切换到麦克风: {self.window.mic_combo.currentText()}")
+        device_index = None if device_id == -1 else device_id
+        if self.recorder and hasattr(self.recorder.source, 'switch_device'):
+            try:
+                self.recorder.switch_device(device_index)
+            except Exception as e:
+                self.window.log(f"切换麦克风失败: {e}")
+            return
         if self.recorder:
             self.recorder.stop_recording()
         if device_id != -1:
-            self.recorder = AudioRecorder(callback=self.process_audio, device_index=device_id)
+            self.recorder = AudioRecorder(callback=self.process_audio, rate=self.rate, device_index=device_id, stats=self.stats, detector=self.detector, analysis_rate=self.analysis_rate)
         else:
-            self.recorder = AudioRecorder(callback=self.process_audio)
+            self.recorder = AudioRecorder(callback=self.process_audio, rate=self.rate, stats=self.stats, detector=self.detector, analysis_rate=self.analysis_rate)
+        self.recorder.set_sensitivity(self.window.sensitivity_slider.value())
         self.recorder.start_recording()
     def change_sensitivity(self, value):
         if self.recorder:
-            threshold = 0.05 * (100 - value) / 100
-            self.recorder.set_threshold(threshold)
+            self.recorder.set_sensitivity(value)
+            threshold = self.recorder.threshold
             self.window.log(f"灵敏度调整为: {value}%，阈值: {threshold:.6f}")
-            print(f"灵敏度调整为: {value}%，阈值: {threshold:.6f}")
     def add_sample(self):
         key = self.window.key_input.text()
         if not key:
             QMessageBox.warning(self.window, "警告", "请输入按下的键")
             return
+        self.model_ready.wait()
         if hasattr(self, 'current_features'):
             self.model.add_sample(key, self.current_features)
             self.window.log(f"添加样本: '{key}'")
@@ -105,19 +200,66 @@ class KeyboardSoundApp:
         else:
             self.window.log("没有可用的样本，请先按下键盘")
     def train_model(self):
+        self.model_ready.wait()
         if self.model.train():
-            self.window.log("模型训练完成")
+            mode = "完整重训练" if self.model.last_train_mode == 'full' else "增量训练"
+            self.window.log(f"模型训练完成（{mode}）")
+            if self.model.pending_compaction is not None:
+                self.window.log("正在后台压缩模型")
+                threading.Thread(target=self.compact_model, daemon=True).start()
             QMessageBox.information(self.window, "成功", "模型训练完成")
         else:
             self.window.log("训练失败，没有足够的样本")
             QMessageBox.warning(self.window, "警告", "训练失败，没有足够的样本")
+    def compact_model(self):
+        try:
+            report = self.model.compact_model()
+        except Exception as e:
+            logger.error("模型压缩失败: %s", e)
+            return
+        if report:
+            logger.info(compaction_summary(report))
     def update_sample_count(self):
         counts = self.model.get_sample_count()
         if counts:
             count_str = ", ".join([f"'{k}': {v}" for k, v in counts.items()])
             self.window.log(f"当前样本数: {count_str}")
+    def shutdown(self):
+        if self.recorder:
+            self.recorder.stop_recording()
+        self.inference.stop()
+        if self.recorder and self.recorder.dropped_frames:
+            print(f"音频输入溢出，丢弃帧数: {self.recorder.dropped_frames}")
+        AudioBackend.shared().terminate()
+        if self.inference.dropped:
+            print(f"推理队列已满，丢弃按键事件: {self.inference.dropped}")
+        render = self.window.visualizer.get_render_stats()
+        if render.get('frames'):
+            print(f"界面渲染: {render['frames']} 帧，平均 {render['mean_fps']:.1f} fps，每帧 CPU {render['mean_cpu_ms_per_frame']:.2f} ms，CPU 占用 {render['mean_cpu_percent']:.1f}%")
+        report = self.stats.report()
+        if report:
+            print(report)
+            os.makedirs('data', exist_ok=True)
+            self.stats.dump(os.path.join('data', 'latency_stats.json'), {'render_stats': render} if render else None)
     def run(self):
-        return self.app.exec_()
+        code = self.app.exec_()
+        self.shutdown()
+        return code
 if __name__ == "__main__":
-    app = KeyboardSoundApp()
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--replay', help='回放音频文件（WAV/FLAC）代替麦克风输入')
+    parser.add_argument('--realtime', action='store_true', help='按实际时间速度回放')
+    parser.add_argument('--workers', type=int, default=1, help='识别工作线程数')
+    parser.add_argument('--max-pending', type=int, default=8, help='待识别按键事件队列上限')
+    parser.add_argument('--drop-policy', choices=InferenceStage.POLICIES, default='drop_oldest', help='队列已满时的处理策略')
+    parser.add_argument('--rate', type=int, default=44100, help='麦克风采集采样率')
+    parser.add_argument('--analysis-rate', type=int, help='分析采样率（与采集采样率不同时做多相重采样，例如 16000）')
+    parser.add_argument('--detector', choices=AudioRecorder.DETECTORS, default='onset', help='按键检测方式：onset 为短帧能量起音检测，rms 为旧的整块音量阈值')
+    parser.add_argument('--log-level', choices=('DEBUG', 'INFO', 'WARNING', 'ERROR'), default='INFO', help='日志级别（DEBUG 会记录每次起音检测）')
+    parser.add_argument('--log-file', help='同时写入滚动日志文件')
+    parser.add_argument('--log-lines', type=int, default=1000, help='日志窗口最多保留的行数')
+    parser.add_argument('--startup-timing', action='store_true', help='输出启动耗时（JSON）后退出')
+    args, _ = parser.parse_known_args()
+    source = FileSource(args.replay, realtime=args.realtime) if args.replay else None
+    app = KeyboardSoundApp(source, workers=args.workers, max_pending=args.max_pending, drop_policy=args.drop_policy, exit_after_startup=args.startup_timing, detector=args.detector, log_level=args.log_level, log_file=args.log_file, log_lines=args.log_lines, rate=args.rate, analysis_rate=args.analysis_rate)
     sys.exit(app.run())
\ No newline at end of file
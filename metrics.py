@@ -0,0 +1,66 @@
+import json
+import math
+import threading
+from bisect import bisect_left
+class LatencyHistogram:
+    def __init__(self, min_value=1e-5, max_value=10.0, bins_per_decade=20):
+        decades = math.log10(max_value / min_value)
+        n_bins = int(math.ceil(decades * bins_per_decade))
+        self.edges = [min_value * 10 ** (i / bins_per_decade) for i in range(n_bins + 1)]
+        self.counts = [0] * (len(self.edges) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = 0.0
+    def record(self, value):
+        self.counts[bisect_left(self.edges, value)] += 1
+        self.count += 1
+        self.total += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+    def percentile(self, q):
+        if not self.count:
+            return 0.0
+        target = q / 100.0 * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= target and n:
+                return min(self.edges[min(i, len(self.edges) - 1)], self.max)
+        return self.max
+    def summary(self):
+        if not self.count:
+            return {'count': 0}
+        return {
+            'count': self.count,
+            'mean_ms': self.total / self.count * 1000,
+            'min_ms': self.min * 1000,
+            'p50_ms': self.percentile(50) * 1000,
+            'p90_ms': self.percentile(90) * 1000,
+            'p99_ms': self.percentile(99) * 1000,
+            'max_ms': self.max * 1000
+        }
+class LatencyStats:
+    def __init__(self):
+        self.histograms = {}
+        self.lock = threading.Lock()
+    def record(self, stage, seconds):
+        with self.lock:
+            if stage not in self.histograms:
+                self.histograms[stage] = LatencyHistogram()
+            self.histograms[stage].record(seconds)
+    def summary(self):
+        with self.lock:
+            return {stage: hist.summary() for stage, hist in self.histograms.items()}
+    def report(self):
+        lines = []
+        for stage, s in self.summary().items():
+            if s['count']:
+                lines.append(f"{stage}: n={s['count']} mean={s['mean_ms']:.2f}ms p50={s['p50_ms']:.2f}ms p99={s['p99_ms']:.2f}ms max={s['max_ms']:.2f}ms")
+        return '\n'.join(lines)
+    def dump(self, path, extra=None):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(dict(self.summary(), **(extra or {})), f, indent=2, ensure_ascii=False)
+    def reset(self):
+        with self.lock:
+            self.histograms = {}
@@ -1,72 +1,366 @@
 import os
+import json
+import time
 import pickle
+import threading
 import numpy as np
-from collections import defaultdict
-from sklearn.ensemble import RandomForestClassifier
+from feature_extractor import FEATURE_NAMES, FEATURE_VERSION, features_to_vector
+from forest_engine import ForestEngine
+from app_logging import get_logger
+MODEL_FORMAT_VERSION = 2
+logger = get_logger('model')
 class KeyboardModel:
-    def __init__(self, model_path='data/keyboard_model.pkl'):
+    def __init__(self, model_path='data/keyboard_model.pkl', n_estimators=100, incremental_trees=10, refit_growth=0.5, min_new_accuracy=0.7, autoload=True, sample_rate=None, compact=True, max_accuracy_loss=0.01):
         self.model = None
-        self.features = defaultdict(list)
+        self.engine = None
+        self.n_estimators = n_estimators
+        self.forest_params = {}
+        self.incremental_trees = incremental_trees
+        self.refit_growth = refit_growth
+        self.min_new_accuracy = min_new_accuracy
+        self.samples_at_refit = 0
+        self.tree_seed = 42
+        self.last_train_mode = None
+        self.sample_rate = sample_rate
+        self.model_rate = None
+        self.compact = compact
+        self.max_accuracy_loss = max_accuracy_loss
+        self.last_compaction = None
+        self.compact_params = None
+        self.pending_compaction = None
+        self.trained_at = None
+        self.lock = threading.Lock()
         self.model_path = model_path
+        self.base_path = os.path.splitext(model_path)[0]
+        self.engine_path = self.base_path + '_engine.npz'
         self.is_trained = False
-        self.load_model()
+        self.X = None
+        self.y = None
+        self.dataset_rate = None
+        self.X_buffer = None
+        self.new_X = []
+        self.new_y = []
+        self.dataset_dirty = False
+        if autoload:
+            self.load_model()
     def add_sample(self, key, features):
-        self.features[key].append(features)
+        self.new_X.append(self._features_to_vector(features))
+        self.new_y.append(key)
+        self.dataset_dirty = True
+    def add_samples(self, keys, X):
+        X = np.asarray(X, dtype=np.float32).reshape(-1, len(FEATURE_NAMES))
+        self.new_X.extend(X)
+        self.new_y.extend(str(k) for k in keys)
+        self.dataset_dirty = True
+    def clear_samples(self):
+        self.X = np.zeros((0, len(FEATURE_NAMES)), dtype=np.float32)
+        self.y = np.array([], dtype=str)
+        self.X_buffer = None
+        self.dataset_rate = self._input_rate()
+        self.new_X, self.new_y = [], []
+        self.dataset_dirty = True
     def get_sample_count(self):
-        return {k: len(v) for k, v in self.features.items()}
+        keys, counts = np.unique(np.concatenate([self._load_labels(), np.array(self.new_y, dtype=str)]), return_counts=True)
+        return {str(k): int(v) for k, v in zip(keys, counts)}
+    def _dataset_paths(self, rate):
+        return self.base_path + f'_dataset_{rate}.json', self.base_path + f'_features_{rate}.npy', self.base_path + f'_labels_{rate}.npy'
+    def _migrate_dataset_files(self):
+        legacy = (self.base_path + '_dataset.json', self.base_path + '_features.npy', self.base_path + '_labels.npy')
+        if not os.path.exists(legacy[0]):
+            return
+        with open(legacy[0], 'r', encoding='utf-8') as f:
+            rate = json.load(f).get('sample_rate', 44100)
+        target = self._dataset_paths(rate)
+        if os.path.exists(target[0]):
+            return
+        for src, dst in zip(legacy[1:] + legacy[:1], target[1:] + target[:1]):
+            if os.path.exists(src):
+                os.replace(src, dst)
+    def _dataset_is_current(self, meta_path):
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+        except FileNotFoundError:
+            return False
+        if meta.get('feature_names') != list(FEATURE_NAMES) or meta.get('feature_version') != FEATURE_VERSION:
+            logger.warning("训练数据特征版本不匹配，已忽略旧数据")
+            return False
+        return True
+    def _other_dataset_rates(self, rate):
+        prefix = os.path.basename(self.base_path) + '_labels_'
+        directory = os.path.dirname(self.base_path) or '.'
+        if not os.path.isdir(directory):
+            return []
+        rates = [name[len(prefix):-4] for name in os.listdir(directory) if name.startswith(prefix) and name.endswith('.npy')]
+        return sorted(int(r) for r in rates if r.isdigit() and int(r) != rate)
+    def _input_rate(self):
+        return self.sample_rate or self.model_rate or 44100
+    def _check_rate(self, sample_rate=None):
+        rate = sample_rate or self._input_rate()
+        if self.model_rate is not None and rate != self.model_rate:
+            raise ValueError(f"模型训练采样率为 {self.model_rate} Hz，输入为 {rate} Hz，请用相同采样率重新训练模型")
+    def _load_labels(self):
+        rate = self._input_rate()
+        if self.y is None or self.dataset_rate != rate:
+            self._migrate_dataset_files()
+            meta_path, _, labels_path = self._dataset_paths(rate)
+            self.X = None
+            self.X_buffer = None
+            self.dataset_rate = rate
+            if os.path.exists(labels_path) and self._dataset_is_current(meta_path):
+                self.y = np.load(labels_path)
+            else:
+                self.y = np.array([], dtype=str)
+            other = self._other_dataset_rates(rate)
+            if other:
+                logger.warning("采样率 %s Hz 的训练数据单独保存，当前 %s Hz 只使用同采样率的样本", '/'.join(map(str, other)), rate)
+        return self.y
+    def _load_features(self):
+        labels = self._load_labels()
+        if self.X is None:
+            if len(labels):
+                self.X = np.load(self._dataset_paths(self.dataset_rate)[1], mmap_mode='r')
+            else:
+                self.X = np.zeros((0, len(FEATURE_NAMES)), dtype=np.float32)
+        return self.X
     def _prepare_data(self):
-        X = []
-        y = []
-        for key, feature_list in self.features.items():
-            for features in feature_list:
-                feature_vector = self._features_to_vector(features)
-                X.append(feature_vector)
-                y.append(key)
-        return np.array(X), np.array(y)
+        X = self._load_features()
+        y = self._load_labels()
+        if self.new_y:
+            n, k = len(y), len(self.new_y)
+            if self.X_buffer is None or self.X_buffer.shape[0] < n + k:
+                capacity = max(2 * (n + k), 64)
+                self.X_buffer = np.empty((capacity, len(FEATURE_NAMES)), dtype=np.float32)
+                self.X_buffer[:n] = X
+            self.X_buffer[n:n + k] = np.array(self.new_X, dtype=np.float32)
+            self.X = X = self.X_buffer[:n + k]
+            self.y = y = np.concatenate([y, np.array(self.new_y, dtype=str)])
+            self.new_X, self.new_y = [], []
+        return X, y
     def _features_to_vector(self, features):
-        feature_vector = []
-        feature_vector.extend(features['mfcc'])
-        feature_vector.append(features['spectral_centroid'])
-        feature_vector.append(features['spectral_bandwidth'])
-        feature_vector.append(features['spectral_rolloff'])
-        feature_vector.append(features['zero_crossing_rate'])
-        feature_vector.append(features['rms'])
-        return feature_vector
-    def train(self):
-        if not self.features:
-            return False
+        return features_to_vector(features)
+    def train(self, full=None):
+        with self.lock:
+            return self._train(full)
+    def _train(self, full):
+        self._load_full_model()
+        n_old = len(self._load_labels())
         X, y = self._prepare_data()
-        if len(np.unique(y)) < 2:
+        if len(y) == 0 or len(np.unique(y)) < 2:
             return False
-        self.model = RandomForestClassifier(n_estimators=100, random_state=42)
-        self.model.fit(X, y)
+        if full is None:
+            full = self.model_rate != self._input_rate() or self._needs_full_refit(X[n_old:], y[n_old:], y)
+        if full:
+            from sklearn.ensemble import RandomForestClassifier
+            self.model = RandomForestClassifier(n_estimators=self.n_estimators, random_state=42, n_jobs=-1, **self.forest_params)
+            self.model.fit(X, y)
+            self.samples_at_refit = len(y)
+            self.tree_seed = 42
+            self.last_train_mode = 'full'
+        else:
+            self._fold_in(X, y)
+            self.last_train_mode = 'incremental'
         self.is_trained = True
+        self.model_rate = self._input_rate()
+        self.last_compaction = None
+        self.pending_compaction = None
+        if not full and self.compact and self.compact_params and self.engine is not None:
+            from model_compaction import fit_compact
+            n_trees = max(1, round(self.incremental_trees * self.compact_params['n_estimators'] / self.n_estimators))
+            fresh = fit_compact(X, y, n_trees, self.compact_params['max_depth'], self.forest_params, self.tree_seed)
+            self.engine = self.engine.rotate_trees(fresh)
+        else:
+            self.engine = None
+            self.compact_params = None
         self.save_model()
+        if self.compact and self.compact_params is None:
+            self.pending_compaction = (X, y, self.trained_at)
         return True
-    def predict(self, features):
-        if not self.is_trained or not self.model:
+    def compact_model(self):
+        from model_compaction import compact_forest
+        with self.lock:
+            if self.pending_compaction is None:
+                return None
+            X, y, trained_at = self.pending_compaction
+            n_estimators, forest_params, max_accuracy_loss = self.n_estimators, dict(self.forest_params), self.max_accuracy_loss
+        engine, report = compact_forest(X, y, n_estimators, forest_params, max_accuracy_loss)
+        with self.lock:
+            if self.trained_at != trained_at:
+                return None
+            self.pending_compaction = None
+            if engine is None:
+                return None
+            self.engine = engine
+            self.compact_params = {'n_estimators': report['chosen']['n_estimators'], 'max_depth': report['chosen']['max_depth']}
+            self.last_compaction = report
+            self._save_artifacts()
+            self._report_artifacts(report)
+        return report
+    def _report_artifacts(self, report):
+        started = time.perf_counter()
+        with open(self.model_path, 'rb') as f:
+            pickle.load(f)
+        report['before']['file_bytes'] = os.path.getsize(self.model_path)
+        report['before']['load_ms'] = (time.perf_counter() - started) * 1000
+        started = time.perf_counter()
+        ForestEngine.load(self.engine_path)
+        report['after']['file_bytes'] = os.path.getsize(self.engine_path)
+        report['after']['load_ms'] = (time.perf_counter() - started) * 1000
+    def _needs_full_refit(self, X_new, y_new, y):
+        if not self.is_trained or self.model is None or self.samples_at_refit == 0:
+            return True
+        if not set(np.unique(y)) <= set(self.model.classes_):
+            return True
+        if len(y) - self.samples_at_refit > self.refit_growth * self.samples_at_refit:
+            return True
+        if len(y_new) and np.mean(self.model.predict(X_new) == y_new) < self.min_new_accuracy:
+            return True
+        return False
+    def _fold_in(self, X, y):
+        from sklearn.ensemble import RandomForestClassifier
+        self.tree_seed += 1
+        fresh = RandomForestClassifier(n_estimators=self.incremental_trees, random_state=self.tree_seed, n_jobs=-1, **self.forest_params)
+        fresh.fit(X, y)
+        self.model.estimators_ = self.model.estimators_[len(fresh.estimators_):] + fresh.estimators_
+    def tune(self, param_grid=None, n_splits=5, n_workers=None, time_budget=None, max_fits=None, apply=True):
+        from model_tuning import cross_validate_grid
+        X, y = self._prepare_data()
+        results = cross_validate_grid(X, y, param_grid, n_splits=n_splits, n_workers=n_workers, time_budget=time_budget, max_fits=max_fits)
+        if apply and results:
+            self.set_params(results[0]['params'])
+            self.train(full=True)
+        return results
+    def set_params(self, params):
+        params = dict(params)
+        self.n_estimators = params.pop('n_estimators', self.n_estimators)
+        self.forest_params = params
+    def _get_engine(self):
+        if self.engine is None:
+            self.engine = ForestEngine.from_sklearn(self.model)
+        return self.engine
+    def predict(self, features, sample_rate=None):
+        if not self.is_trained or (self.model is None and self.engine is None):
             return None, 0
-        feature_vector = self._features_to_vector(features)
-        feature_vector = np.array(feature_vector).reshape(1, -1)
-        prediction = self.model.predict(feature_vector)[0]
-        confidence = np.max(self.model.predict_proba(feature_vector))
-        return prediction, confidence
+        self._check_rate(sample_rate)
+        return self._get_engine().predict_one(self._features_to_vector(features))
+    def predict_batch(self, X, sample_rate=None):
+        if not self.is_trained or (self.model is None and self.engine is None):
+            return np.full(len(X), None, dtype=object), np.zeros(len(X))
+        self._check_rate(sample_rate)
+        return self._get_engine().predict(X)
     def save_model(self):
         os.makedirs(os.path.dirname(self.model_path), exist_ok=True)
-        with open(self.model_path, 'wb') as f:
-            pickle.dump({
-                'model': self.model,
-                'features': dict(self.features),
-                'is_trained': self.is_trained
-            }, f)
+        if self.dataset_dirty:
+            self.save_dataset()
+        self._save_artifacts()
+    def _save_artifacts(self):
+        self.trained_at = time.time()
+        header = {
+            'format_version': MODEL_FORMAT_VERSION,
+            'feature_names': list(FEATURE_NAMES),
+            'feature_version': FEATURE_VERSION,
+            'classes': [str(c) for c in self.model.classes_] if self.model is not None else [],
+            'samples_at_refit': self.samples_at_refit,
+            'tree_seed': self.tree_seed,
+            'n_estimators': self.n_estimators,
+            'forest_params': self.forest_params,
+            'compact_params': self.compact_params,
+            'sample_rate': self.model_rate,
+            'trained_at': self.trained_at,
+            'is_trained': self.is_trained
+        }
+        if self.model is not None:
+            self._get_engine().save(self.engine_path, header)
+        elif os.path.exists(self.engine_path):
+            os.remove(self.engine_path)
+        tmp_path = self.model_path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(dict(header, model=self.model), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self.model_path)
+    def save_dataset(self):
+        X, y = self._prepare_data()
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        meta_path, features_path, labels_path = self._dataset_paths(self.dataset_rate)
+        np.save(features_path + '.tmp.npy', X)
+        np.save(labels_path + '.tmp.npy', y)
+        os.replace(features_path + '.tmp.npy', features_path)
+        os.replace(labels_path + '.tmp.npy', labels_path)
+        with open(meta_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'format_version': MODEL_FORMAT_VERSION,
+                'feature_names': list(FEATURE_NAMES),
+                'feature_version': FEATURE_VERSION,
+                'sample_rate': self.dataset_rate,
+                'n_samples': int(len(y))
+            }, f, ensure_ascii=False)
+        self.dataset_dirty = False
     def load_model(self):
+        if os.path.exists(self.engine_path):
+            try:
+                engine, header = ForestEngine.load(self.engine_path)
+            except Exception as e:
+                logger.warning("加载推理模型失败: %s", e)
+            else:
+                if not self._apply_header(header):
+                    return False
+                self.model = None
+                self.engine = engine
+                return True
         try:
             with open(self.model_path, 'rb') as f:
                 data = pickle.load(f)
-                self.model = data['model']
-                self.features = defaultdict(list, data['features'])
-                self.is_trained = data['is_trained']
-            return True
         except Exception as e:
-            print(f"加载模型失败: {e}")
-            return False
\ No newline at end of file
+            logger.warning("加载模型失败: %s", e)
+            return False
+        if 'features' in data and 'format_version' not in data:
+            return self._migrate_legacy(data)
+        if not self._apply_header(data):
+            return False
+        self.model = data['model']
+        self.engine = None
+        self.compact_params = None
+        return True
+    def _load_full_model(self):
+        if self.model is not None or not self.is_trained or not os.path.exists(self.model_path):
+            return
+        with open(self.model_path, 'rb') as f:
+            data = pickle.load(f)
+        if data.get('trained_at') != self.trained_at:
+            logger.warning("推理模型与完整模型不一致，将重新训练")
+            self.is_trained = False
+            self.samples_at_refit = 0
+            return
+        self.model = data['model']
+    def _apply_header(self, data):
+        if data.get('format_version') != MODEL_FORMAT_VERSION:
+            logger.warning("模型格式版本不匹配: %s，请重新训练模型", data.get('format_version'))
+            return False
+        if data.get('feature_names') != list(FEATURE_NAMES) or data.get('feature_version') != FEATURE_VERSION:
+            logger.warning("模型特征顺序或版本已变化，请重新训练模型")
+            return False
+        self.is_trained = data['is_trained']
+        self.trained_at = data.get('trained_at')
+        self.samples_at_refit = data.get('samples_at_refit', 0)
+        self.tree_seed = data.get('tree_seed', 42)
+        self.n_estimators = data.get('n_estimators', self.n_estimators)
+        self.forest_params = data.get('forest_params', {})
+        self.compact_params = data.get('compact_params')
+        self.model_rate = data.get('sample_rate', 44100) if self.is_trained else None
+        if self.sample_rate and self.model_rate and self.sample_rate != self.model_rate:
+            logger.warning("模型训练采样率为 %s Hz，当前分析采样率为 %s Hz，识别前需要重新训练", self.model_rate, self.sample_rate)
+        return True
+    def _migrate_legacy(self, data):
+        for key, feature_list in data['features'].items():
+            for features in feature_list:
+                self.add_sample(key, features)
+        self.model = data['model']
+        self.is_trained = data['is_trained']
+        self.model_rate = 44100 if self.is_trained else None
+        self.y = np.array([], dtype=str)
+        self.X = np.zeros((0, len(FEATURE_NAMES)), dtype=np.float32)
+        self.dataset_rate = 44100
+        sample_rate, self.sample_rate = self.sample_rate, None
+        self.save_model()
+        self.sample_rate = sample_rate
+        logger.info("已将旧版模型文件迁移为新格式")
+        return True
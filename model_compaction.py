@@ -0,0 +1,71 @@
+import time
+import numpy as np
+from forest_engine import ForestEngine
+TREE_COUNTS = (100, 64, 48, 32, 24, 16)
+MIN_TREES = 16
+DEPTHS = (None, 20, 14, 10, 8)
+def _latency(engine, X, repeat=200):
+    rows = X[np.arange(repeat) % len(X)]
+    engine.predict_one(rows[0])
+    started = time.perf_counter()
+    for row in rows:
+        engine.predict_one(row)
+    return (time.perf_counter() - started) / repeat
+def fit_compact(X, y, n_estimators, max_depth, forest_params=None, random_state=42):
+    from sklearn.ensemble import RandomForestClassifier
+    forest_params = dict(forest_params or {})
+    forest_params.pop('max_depth', None)
+    forest = RandomForestClassifier(n_estimators=n_estimators, max_depth=max_depth, random_state=random_state, n_jobs=-1, **forest_params)
+    forest.fit(np.ascontiguousarray(X, dtype=np.float32), y)
+    return ForestEngine.from_sklearn(forest)
+def compact_forest(X, y, n_estimators=100, forest_params=None, max_accuracy_loss=0.01, test_size=0.25, tree_counts=TREE_COUNTS, depths=DEPTHS, min_trees=MIN_TREES, random_state=42):
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.model_selection import train_test_split
+    forest_params = dict(forest_params or {})
+    base_depth = forest_params.pop('max_depth', None)
+    X = np.ascontiguousarray(X, dtype=np.float32)
+    _, counts = np.unique(y, return_counts=True)
+    n_test = int(round(test_size * len(y)))
+    if counts.min() < 2 or n_test < len(counts) or 1.0 / n_test > max_accuracy_loss:
+        return None, None
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=test_size, stratify=y, random_state=random_state)
+    candidates = []
+    reference = None
+    tree_counts = sorted({min(n, n_estimators) for n in tree_counts if n >= min_trees} | {n_estimators}, reverse=True)
+    for depth in depths:
+        if depth is not None and base_depth is not None and depth >= base_depth:
+            continue
+        max_depth = base_depth if depth is None else depth
+        forest = RandomForestClassifier(n_estimators=n_estimators, max_depth=max_depth, random_state=random_state, n_jobs=-1, **forest_params)
+        forest.fit(X_train, y_train)
+        engine = ForestEngine.from_sklearn(forest)
+        first = len(candidates)
+        for n_trees in tree_counts:
+            forest.estimators_ = forest.estimators_[:n_trees]
+            subset = ForestEngine.from_sklearn(forest)
+            accuracy = float(np.mean(subset.predict(X_test)[0] == y_test))
+            candidates.append({'n_estimators': n_trees, 'max_depth': max_depth, 'accuracy': accuracy, 'n_nodes': subset.n_nodes})
+        if depth is None:
+            reference = candidates[first]
+            reference_engine = engine
+    floor = reference['accuracy'] - max_accuracy_loss
+    chosen = min((c for c in candidates if c['accuracy'] >= floor), key=lambda c: (c['n_nodes'], -c['accuracy']))
+    compact_engine = fit_compact(X, y, chosen['n_estimators'], chosen['max_depth'], forest_params, random_state)
+    report = {
+        'max_accuracy_loss': max_accuracy_loss,
+        'n_test': int(len(y_test)),
+        'chosen': chosen,
+        'reference': reference,
+        'before': {'n_nodes': reference_engine.n_nodes, 'engine_bytes': reference_engine.nbytes, 'predict_ms': _latency(reference_engine, X_test) * 1000},
+        'after': {'n_nodes': compact_engine.n_nodes, 'engine_bytes': compact_engine.nbytes, 'predict_ms': _latency(compact_engine, X_test) * 1000},
+        'candidates': candidates
+    }
+    return compact_engine, report
+def compaction_summary(report):
+    before, after, chosen = report['before'], report['after'], report['chosen']
+    return (f"模型压缩: {chosen['n_estimators']} 棵树，最大深度 {chosen['max_depth']}，"
+            f"节点 {before['n_nodes']} -> {after['n_nodes']}，"
+            f"文件 {before['file_bytes'] / 1024:.0f} KB -> {after['file_bytes'] / 1024:.0f} KB，"
+            f"加载 {before['load_ms']:.1f} ms -> {after['load_ms']:.1f} ms，"
+            f"单次预测 {before['predict_ms']:.3f} ms -> {after['predict_ms']:.3f} ms，"
+            f"验证准确率 {report['reference']['accuracy']:.3f} -> {chosen['accuracy']:.3f}")
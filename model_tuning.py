@@ -0,0 +1,107 @@
+import os
+import time
+import itertools
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from multiprocessing import shared_memory
+DEFAULT_GRID = {
+    'n_estimators': [50, 100, 200],
+    'max_depth': [None, 20, 12],
+    'max_features': ['sqrt', 0.5],
+}
+_worker = {}
+def _init_worker(shm_name, shape, dtype, y):
+    shm = shared_memory.SharedMemory(name=shm_name)
+    _worker['shm'] = shm
+    _worker['X'] = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+    _worker['y'] = y
+def _run_fold(config_id, params, train_idx, test_idx, classes):
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.metrics import confusion_matrix
+    X, y = _worker['X'], _worker['y']
+    clf = RandomForestClassifier(random_state=42, n_jobs=1, **params)
+    started = time.perf_counter()
+    clf.fit(X[train_idx], y[train_idx])
+    fitted = time.perf_counter()
+    predicted = clf.predict(X[test_idx])
+    finished = time.perf_counter()
+    return {
+        'config_id': config_id,
+        'accuracy': float(np.mean(predicted == y[test_idx])),
+        'confusion': confusion_matrix(y[test_idx], predicted, labels=classes),
+        'fit_time': fitted - started,
+        'predict_time': (finished - fitted) / len(test_idx)
+    }
+def expand_grid(param_grid):
+    names = sorted(param_grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(param_grid[n] for n in names))]
+def cross_validate_grid(X, y, param_grid=None, n_splits=5, n_workers=None, time_budget=None, max_fits=None):
+    from sklearn.model_selection import StratifiedKFold
+    configs = expand_grid(param_grid or DEFAULT_GRID)
+    classes, counts = np.unique(y, return_counts=True)
+    n_splits = min(n_splits, int(counts.min()))
+    if n_splits < 2:
+        raise ValueError("交叉验证要求每个按键至少有 2 个样本")
+    folds = list(StratifiedKFold(n_splits=n_splits, shuffle=True, random_state=42).split(np.zeros(len(y)), y))
+    tasks = [(i, params, train_idx, test_idx) for i, params in enumerate(configs) for train_idx, test_idx in folds]
+    if max_fits is not None:
+        tasks = tasks[:max_fits]
+    n_workers = n_workers or os.cpu_count() or 1
+    X = np.ascontiguousarray(X, dtype=np.float32)
+    shm = shared_memory.SharedMemory(create=True, size=max(X.nbytes, 1))
+    fold_results = {i: [] for i in range(len(configs))}
+    deadline = None if time_budget is None else time.perf_counter() + time_budget
+    try:
+        np.ndarray(X.shape, dtype=X.dtype, buffer=shm.buf)[:] = X
+        with ProcessPoolExecutor(max_workers=n_workers, initializer=_init_worker, initargs=(shm.name, X.shape, X.dtype, y)) as executor:
+            pending = set()
+            next_task = 0
+            while next_task < len(tasks) or pending:
+                out_of_time = deadline is not None and time.perf_counter() > deadline
+                while not out_of_time and next_task < len(tasks) and len(pending) < 2 * n_workers:
+                    config_id, params, train_idx, test_idx = tasks[next_task]
+                    pending.add(executor.submit(_run_fold, config_id, params, train_idx, test_idx, classes))
+                    next_task += 1
+                if not pending:
+                    break
+                timeout = None if deadline is None else max(0.0, deadline - time.perf_counter())
+                done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+                for future in done:
+                    result = future.result()
+                    fold_results[result['config_id']].append(result)
+                if deadline is not None and time.perf_counter() > deadline:
+                    for future in pending:
+                        future.cancel()
+                    done, _ = wait(pending)
+                    for future in done:
+                        if not future.cancelled():
+                            result = future.result()
+                            fold_results[result['config_id']].append(result)
+                    break
+    finally:
+        shm.close()
+        shm.unlink()
+    return _summarize(configs, fold_results, classes, n_splits)
+def _summarize(configs, fold_results, classes, n_splits):
+    summaries = []
+    for config_id, params in enumerate(configs):
+        results = fold_results[config_id]
+        if not results:
+            continue
+        confusion = sum(r['confusion'] for r in results)
+        support = confusion.sum(axis=1)
+        accuracies = [r['accuracy'] for r in results]
+        summaries.append({
+            'params': params,
+            'folds': len(results),
+            'complete': len(results) == n_splits,
+            'accuracy': float(np.mean(accuracies)),
+            'accuracy_std': float(np.std(accuracies)),
+            'fit_time': float(np.mean([r['fit_time'] for r in results])),
+            'predict_time_per_sample': float(np.mean([r['predict_time'] for r in results])),
+            'per_key_accuracy': {str(k): float(confusion[i, i] / support[i]) if support[i] else 0.0 for i, k in enumerate(classes)},
+            'confusion': confusion.tolist(),
+            'classes': [str(k) for k in classes]
+        })
+    summaries.sort(key=lambda s: (not s['complete'], -s['accuracy'], s['fit_time']))
+    return summaries
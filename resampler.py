@@ -0,0 +1,48 @@
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from math import gcd
+class PolyphaseResampler:
+    def __init__(self, in_rate, out_rate, zero_crossings=10, beta=5.0):
+        g = gcd(int(in_rate), int(out_rate))
+        self.in_rate = int(in_rate)
+        self.out_rate = int(out_rate)
+        self.up = self.out_rate // g
+        self.down = self.in_rate // g
+        max_rate = max(self.up, self.down)
+        half_len = zero_crossings * max_rate
+        n = np.arange(-half_len, half_len + 1)
+        cutoff = 1.0 / max_rate
+        h = cutoff * np.sinc(cutoff * n) * np.kaiser(len(n), beta)
+        h *= self.up / h.sum()
+        self.taps = -(-len(h) // self.up)
+        padded = np.zeros(self.taps * self.up)
+        padded[:len(h)] = h
+        self.phases = np.ascontiguousarray(padded.reshape(self.taps, self.up).T.astype(np.float32))
+        self.kernel = np.ascontiguousarray(self.phases[0, ::-1])
+        self.delay = half_len / self.down
+        self.reset()
+    def reset(self):
+        self.history = np.zeros(self.taps - 1, dtype=np.float32)
+        self.consumed = 0
+        self.next_output = 0
+    def process(self, samples):
+        samples = np.asarray(samples, dtype=np.float32).ravel()
+        if self.up == self.down:
+            return samples
+        last = self.consumed + len(samples) - 1
+        end = (last * self.up + self.up - 1) // self.down + 1
+        buf = np.concatenate([self.history, samples])
+        outputs = np.arange(self.next_output, end, dtype=np.int64) * self.down
+        local = outputs // self.up - (self.consumed - (self.taps - 1))
+        if not len(local):
+            out = np.zeros(0, dtype=np.float32)
+        elif self.up == 1:
+            start = int(local[0]) - (self.taps - 1)
+            out = sliding_window_view(buf, self.taps)[start::self.down][:len(local)] @ self.kernel
+        else:
+            frames = buf[local[:, None] - np.arange(self.taps)]
+            out = np.einsum('ij,ij->i', frames, self.phases[outputs % self.up])
+        self.history = buf[len(buf) - (self.taps - 1):]
+        self.consumed += len(samples)
+        self.next_output = max(end, self.next_output)
+        return out
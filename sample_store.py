@@ -0,0 +1,146 @@
+import os
+import json
+import time
+import numpy as np
+from array import array
+from pathlib import Path
+from typing import Dict, List, Optional
+class SampleStore:
+    VERSION = 1
+    COLUMNS = {
+        'features': np.float32,
+        'labels': np.int32,
+        'timestamps': np.float64,
+        'audio_offsets': np.int64,
+        'audio': np.float32,
+    }
+    def __init__(self, directory: str, n_features: int = 18):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.meta_file = self.directory / 'meta.json'
+        self.keys_file = self.directory / 'keys.json'
+        meta = self._read_json(self.meta_file, {})
+        self.n_features = meta.get('n_features', n_features)
+        self.n_rows = meta.get('n_rows', 0)
+        self.audio_samples = meta.get('audio_samples', 0)
+        if meta.get('version', self.VERSION) != self.VERSION:
+            raise ValueError(f"样本库版本不兼容: {meta.get('version')}")
+        self.key_names: List[str] = self._read_json(self.keys_file, [])
+        self.key_ids: Dict[str, int] = {k: i for i, k in enumerate(self.key_names)}
+        self._discard_uncommitted()
+        labels = np.fromfile(self._path('labels'), dtype=np.int32, count=self.n_rows)
+        self.labels = array('i', labels.tobytes())
+        self.key_rows: Dict[int, List[int]] = {}
+        for key_id in range(len(self.key_names)):
+            self.key_rows[key_id] = np.flatnonzero(labels == key_id).tolist()
+        self.pending_labels: List[int] = []
+        self.pending_audio_samples = 0
+        self.files = {name: open(self._path(name), 'ab') for name in self.COLUMNS}
+        self._features = None
+    def _path(self, name: str) -> Path:
+        return self.directory / f'{name}.bin'
+    def _read_json(self, path: Path, default):
+        if path.exists():
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        return default
+    def _write_json(self, path: Path, data) -> None:
+        tmp = path.with_suffix('.tmp')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    def _discard_uncommitted(self) -> None:
+        sizes = {
+            'features': self.n_rows * self.n_features,
+            'labels': self.n_rows,
+            'timestamps': self.n_rows,
+            'audio_offsets': self.n_rows * 2,
+            'audio': self.audio_samples,
+        }
+        for name, dtype in self.COLUMNS.items():
+            path = self._path(name)
+            expected = sizes[name] * np.dtype(dtype).itemsize
+            if not path.exists():
+                path.touch()
+            elif path.stat().st_size > expected:
+                os.truncate(path, expected)
+    def append(self, key: str, features: np.ndarray, audio: Optional[np.ndarray] = None, timestamp: Optional[float] = None, commit: bool = True) -> int:
+        features = np.asarray(features, dtype=np.float32).ravel()
+        if len(features) != self.n_features:
+            raise ValueError(f"特征维度不匹配: {len(features)} != {self.n_features}")
+        if key not in self.key_ids:
+            self.key_ids[key] = len(self.key_names)
+            self.key_names.append(key)
+            self.key_rows[self.key_ids[key]] = []
+            self._write_json(self.keys_file, self.key_names)
+        key_id = self.key_ids[key]
+        audio = np.zeros(0, dtype=np.float32) if audio is None else np.asarray(audio, dtype=np.float32).ravel()
+        self.files['features'].write(features.tobytes())
+        self.files['labels'].write(np.int32(key_id).tobytes())
+        self.files['timestamps'].write(np.float64(time.time() if timestamp is None else timestamp).tobytes())
+        self.files['audio_offsets'].write(np.array([self.audio_samples + self.pending_audio_samples, len(audio)], dtype=np.int64).tobytes())
+        self.files['audio'].write(audio.tobytes())
+        self.pending_labels.append(key_id)
+        self.pending_audio_samples += len(audio)
+        if commit:
+            self.commit()
+        return self.n_rows + len(self.pending_labels) - 1
+    def commit(self) -> None:
+        if not self.pending_labels:
+            return
+        for f in self.files.values():
+            f.flush()
+            os.fsync(f.fileno())
+        for i, key_id in enumerate(self.pending_labels):
+            self.key_rows[key_id].append(self.n_rows + i)
+        self.labels.extend(self.pending_labels)
+        self.n_rows += len(self.pending_labels)
+        self.audio_samples += self.pending_audio_samples
+        self.pending_labels = []
+        self.pending_audio_samples = 0
+        self._features = None
+        self._write_json(self.meta_file, {
+            'version': self.VERSION,
+            'n_rows': self.n_rows,
+            'n_features': self.n_features,
+            'audio_samples': self.audio_samples,
+        })
+    def __len__(self) -> int:
+        return self.n_rows
+    def keys(self) -> List[str]:
+        return [k for k in self.key_names if self.key_rows[self.key_ids[k]]]
+    def count(self, key: Optional[str] = None) -> int:
+        if key is None:
+            return self.n_rows
+        return len(self.key_rows.get(self.key_ids.get(key, -1), []))
+    def features(self) -> np.ndarray:
+        if self._features is None:
+            if self.n_rows == 0:
+                self._features = np.zeros((0, self.n_features), dtype=np.float32)
+            else:
+                self._features = np.memmap(self._path('features'), dtype=np.float32, mode='r', shape=(self.n_rows, self.n_features))
+        return self._features
+    def rows(self, key: str) -> np.ndarray:
+        return np.array(self.key_rows.get(self.key_ids.get(key, -1), []), dtype=np.int64)
+    def get_features(self, key: Optional[str] = None) -> np.ndarray:
+        if key is None:
+            return self.features()
+        return self.features()[self.rows(key)]
+    def get_labels(self) -> np.ndarray:
+        return np.array(self.key_names, dtype=object)[np.frombuffer(self.labels, dtype=np.int32)] if self.n_rows else np.array([], dtype=object)
+    def get_timestamps(self) -> np.ndarray:
+        return np.memmap(self._path('timestamps'), dtype=np.float64, mode='r', shape=(self.n_rows,)) if self.n_rows else np.zeros(0)
+    def get_audio(self, row: int) -> np.ndarray:
+        offsets = np.memmap(self._path('audio_offsets'), dtype=np.int64, mode='r', shape=(self.n_rows, 2))
+        start, length = (int(v) for v in offsets[row])
+        if length == 0:
+            return np.zeros(0, dtype=np.float32)
+        return np.memmap(self._path('audio'), dtype=np.float32, mode='r', offset=start * 4, shape=(length,))
+    def close(self) -> None:
+        self.commit()
+        for f in self.files.values():
+            f.close()
+        self.files = {}
+        self._features = None
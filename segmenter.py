@@ -0,0 +1,176 @@
+import numpy as np
+from app_logging import get_logger
+logger = get_logger('segmenter')
+class RingBuffer:
+    def __init__(self, capacity):
+        self.capacity = int(capacity)
+        self.buffer = np.zeros(self.capacity, dtype=np.float32)
+        self.total = 0
+    def write(self, samples):
+        samples = np.asarray(samples, dtype=np.float32)
+        n = len(samples)
+        if n >= self.capacity:
+            samples = samples[-self.capacity:]
+            self.total += n - self.capacity
+            n = self.capacity
+        start = self.total % self.capacity
+        first = min(n, self.capacity - start)
+        self.buffer[start:start + first] = samples[:first]
+        if first < n:
+            self.buffer[:n - first] = samples[first:]
+        self.total += n
+    def oldest(self):
+        return max(0, self.total - self.capacity)
+    def read(self, start, end):
+        start = max(start, self.oldest())
+        end = min(end, self.total)
+        out = np.empty(max(0, end - start), dtype=np.float32)
+        if len(out) == 0:
+            return out
+        i = start % self.capacity
+        first = min(len(out), self.capacity - i)
+        out[:first] = self.buffer[i:i + first]
+        if first < len(out):
+            out[first:] = self.buffer[:len(out) - first]
+        return out
+class KeyEvent:
+    __slots__ = ('audio', 'onset', 'offset', 'peak_rms', 'captured_at', 'segmented_at')
+    def __init__(self, audio, onset, offset, peak_rms=0.0, captured_at=None, segmented_at=None):
+        self.audio = audio
+        self.onset = onset
+        self.offset = offset
+        self.peak_rms = peak_rms
+        self.captured_at = captured_at
+        self.segmented_at = segmented_at
+    def __len__(self):
+        return len(self.audio)
+class KeySegmenter:
+    def __init__(self, rate=44100, threshold=0.02, silence_timeout=0.3, pre_roll=0.01, max_event_duration=2.0, min_loud_chunks=3):
+        self.rate = rate
+        self.threshold = threshold
+        self.silence_timeout = silence_timeout
+        self.pre_roll = int(pre_roll * rate)
+        self.min_loud_chunks = min_loud_chunks
+        self.ring = RingBuffer(int(max_event_duration * rate) + self.pre_roll)
+        self.reset()
+    def set_sensitivity(self, value):
+        self.threshold = 0.05 * (100 - value) / 100
+    def reset(self):
+        self.is_key_pressed = False
+        self.onset = 0
+        self.last_loud_end = 0
+        self.loud_chunks = 0
+        self.peak_rms = 0.0
+    def process(self, audio_data):
+        events = []
+        start = self.ring.total
+        self.ring.write(audio_data)
+        end = self.ring.total
+        rms = float(np.sqrt(np.mean(np.square(audio_data)))) if len(audio_data) else 0.0
+        if rms > self.threshold:
+            if not self.is_key_pressed:
+                self.is_key_pressed = True
+                self.onset = start
+                self.loud_chunks = 0
+                self.peak_rms = 0.0
+                logger.debug("检测到可能的按键声音，音量: %.6f", rms)
+            self.last_loud_end = end
+            self.loud_chunks += 1
+            self.peak_rms = max(self.peak_rms, rms)
+        elif self.is_key_pressed and end - self.last_loud_end > self.silence_timeout * self.rate:
+            event = self._close()
+            if event is not None:
+                events.append(event)
+        return events
+    def _close(self):
+        self.is_key_pressed = False
+        if self.loud_chunks < self.min_loud_chunks:
+            return None
+        onset = max(self.onset - self.pre_roll, self.ring.oldest())
+        offset = self.last_loud_end
+        return KeyEvent(self.ring.read(onset, offset), onset, offset, self.peak_rms)
+    def flush(self):
+        if self.is_key_pressed:
+            event = self._close()
+            if event is not None:
+                return [event]
+        return []
+class OnsetDetector:
+    def __init__(self, rate=44100, hop_length=128, event_duration=0.1, pre_roll=0.005, min_interval=0.04, sensitivity=50, rise=4.0, lookback=3, floor_decay=0.98):
+        self.rate = rate
+        self.hop_length = hop_length
+        self.event_length = int(event_duration * rate)
+        self.pre_roll = int(pre_roll * rate)
+        self.min_interval = int(min_interval * rate)
+        self.rise = rise
+        self.lookback = lookback
+        self.floor_decay = floor_decay
+        self.ring = RingBuffer(max(rate, 4 * (self.event_length + self.pre_roll)))
+        self.set_sensitivity(sensitivity)
+        self.reset()
+    def set_sensitivity(self, value):
+        self.sensitivity = value
+        self.ratio = 10 ** ((24 - 0.2 * value) / 10)
+        self.threshold = 0.01 * (100 - value) / 100 + 1e-4
+    @property
+    def threshold(self):
+        return self._threshold
+    @threshold.setter
+    def threshold(self, value):
+        self._threshold = value
+        self.min_energy = value * value * self.hop_length
+    def reset(self):
+        self.carry = np.zeros(0, dtype=np.float32)
+        self.history = np.zeros(self.lookback, dtype=np.float32)
+        self.frame_pos = self.ring.total
+        self.floor = None
+        self.last_onset = -self.min_interval
+        self.pending = []
+    def process(self, audio_data):
+        samples = np.asarray(audio_data, dtype=np.float32)
+        self.ring.write(samples)
+        if len(self.carry):
+            samples = np.concatenate([self.carry, samples])
+        n = len(samples) // self.hop_length
+        used = n * self.hop_length
+        self.carry = samples[used:].copy() if used < len(samples) else samples[:0]
+        if n:
+            frames = samples[:used].reshape(n, self.hop_length)
+            self._detect(np.add.reduce(frames * frames, 1))
+            self.frame_pos += used
+        return self._ready(self.ring.total)
+    def _detect(self, energy):
+        quiet = float(np.minimum.reduce(energy))
+        if self.floor is None or quiet < self.floor:
+            self.floor = quiet
+        else:
+            self.floor = self.floor_decay * self.floor + (1 - self.floor_decay) * quiet
+        level = max(self.floor * self.ratio, self.min_energy)
+        extended = np.concatenate([self.history, energy])
+        self.history = extended[-self.lookback:]
+        if np.maximum.reduce(energy) <= level:
+            return
+        previous = extended[:len(energy)]
+        for shift in range(1, self.lookback):
+            previous = np.minimum(previous, extended[shift:shift + len(energy)])
+        for i in np.flatnonzero((energy > level) & (energy > self.rise * previous)):
+            onset = self.frame_pos + int(i) * self.hop_length
+            if onset - self.last_onset < self.min_interval:
+                continue
+            self.last_onset = onset
+            peak_rms = float(np.sqrt(energy[i:i + max(1, self.min_interval // self.hop_length)].max() / self.hop_length))
+            self.pending.append((onset, peak_rms))
+            logger.debug("检测到可能的按键声音，音量: %.6f", peak_rms)
+    def _ready(self, available):
+        events = []
+        while self.pending and self.pending[0][0] - self.pre_roll + self.event_length <= available:
+            events.append(self._cut(*self.pending.pop(0)))
+        return events
+    def _cut(self, onset, peak_rms):
+        start = max(onset - self.pre_roll, self.ring.oldest())
+        end = min(start + self.event_length, self.ring.total)
+        return KeyEvent(self.ring.read(start, end), start, end, peak_rms)
+    def flush(self):
+        events = [self._cut(onset, peak_rms) for onset, peak_rms in self.pending]
+        self.pending = []
+        return events
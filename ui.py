@@ -1,15 +1,26 @@
-from PyQt5.QtWidgets import QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QLabel, QComboBox, QSlider, QRadioButton, QPushButton, QLineEdit, QTextEdit, QGroupBox
-from PyQt5.QtCore import Qt
+from PyQt5.QtWidgets import QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QLabel, QComboBox, QSlider, QRadioButton, QPushButton, QLineEdit, QPlainTextEdit, QGroupBox
+from PyQt5.QtCore import Qt, QTimer, pyqtSignal
+import time
+import threading
 import matplotlib.pyplot as plt
+from matplotlib.path import Path
+from matplotlib.patches import PathPatch
 from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
 import numpy as np
+from app_logging import get_logger
+logger = get_logger('ui')
 class AudioVisualizer(QWidget):
-    def __init__(self, parent=None):
+    def __init__(self, parent=None, blit=True, fps=30):
         super().__init__(parent)
+        self.blit = blit
+        self.fps = fps
         self.setup_ui()
         self.audio_buffer = np.zeros(8192)
         self.update_counter = 0
         self.update_rate = 3
+        self.stats = None
+        if self.blit:
+            self.setup_blit()
     def setup_ui(self):
         layout = QVBoxLayout()
         plt.close('all')
@@ -34,6 +45,9 @@ class AudioVisualizer(QWidget):
         layout.addWidget(self.spec_canvas)
         self.setLayout(layout)
     def update_waveform(self, audio_data):
+        if self.blit:
+            self._push_samples(np.asarray(audio_data, dtype=np.float32))
+            return
         try:
             self.update_counter += 1
             if self.update_counter % self.update_rate != 0:
@@ -65,15 +79,148 @@ class AudioVisualizer(QWidget):
             )
             self.waveform_canvas.draw()
         except Exception as e:
-            print(f"波形图更新错误: {e}")
+            logger.error("波形图更新错误: %s", e)
     def update_spectrogram(self, spec_data):
+        if self.blit:
+            self.pending_spec = spec_data
+            return
         try:
             self.spec_img.set_data(spec_data)
             self.spec_img.set_clim(np.min(spec_data), np.max(spec_data))
             self.spec_canvas.draw()
         except Exception as e:
-            print(f"频谱图更新错误: {e}")
+            logger.error("频谱图更新错误: %s", e)
+    def setup_blit(self):
+        self.buffer_lock = threading.Lock()
+        self.ring = np.zeros(8192, dtype=np.float32)
+        self.ring_pos = 0
+        self.display = np.zeros(8192, dtype=np.float32)
+        self.waveform_dirty = False
+        self.pending_spec = None
+        self.spec_source = None
+        self.spec_version = -1
+        self.waveform_bg = None
+        self.spec_bg = None
+        self.waveform_line.set_animated(True)
+        for coll in self.waveform_ax.collections[:]:
+            coll.remove()
+        self.display_bins = 512
+        x = np.repeat(np.linspace(0, 8192, self.display_bins, endpoint=False) + 8192 / self.display_bins / 2, 2)
+        self.envelope = np.zeros(2 * self.display_bins)
+        self.waveform_line.set_data(x, self.envelope)
+        vertices = np.empty((2 * len(x) + 1, 2))
+        vertices[:len(x), 0] = x
+        vertices[len(x):-1, 0] = x[::-1]
+        vertices[:-1, 1] = -0.01
+        vertices[-1] = vertices[0]
+        self.fill_path = Path(vertices)
+        self.waveform_fill = self.waveform_ax.add_patch(PathPatch(self.fill_path, alpha=0.4, color='#3366cc', lw=0))
+        self.waveform_fill.set_animated(True)
+        self.spec_img.set_animated(True)
+        self.spec_img.set_interpolation('nearest')
+        self.waveform_canvas.mpl_connect('draw_event', self._on_waveform_draw)
+        self.spec_canvas.mpl_connect('draw_event', self._on_spec_draw)
+        self.frames = 0
+        self.frame_window_start = time.perf_counter()
+        self.render_cpu = 0.0
+        self.measured_fps = 0.0
+        self.cpu_per_frame = 0.0
+        self.cpu_load = 0.0
+        self.total_frames = 0
+        self.total_render_cpu = 0.0
+        self.render_started = time.perf_counter()
+        self.render_timer = QTimer(self)
+        self.render_timer.timeout.connect(self.render_frame)
+        self.render_timer.start(int(1000 / self.fps))
+    def set_fps(self, fps):
+        self.fps = fps
+        if self.blit:
+            self.render_timer.setInterval(int(1000 / fps))
+    def set_stats(self, stats):
+        self.stats = stats
+    def set_spectrogram_source(self, source):
+        self.spec_source = source
+        if self.blit:
+            self.spec_version = -1
+    def _on_waveform_draw(self, event):
+        self.waveform_bg = self.waveform_canvas.copy_from_bbox(self.waveform_ax.bbox)
+        self.waveform_ax.draw_artist(self.waveform_fill)
+        self.waveform_ax.draw_artist(self.waveform_line)
+    def _on_spec_draw(self, event):
+        self.spec_bg = self.spec_canvas.copy_from_bbox(self.spec_ax.bbox)
+        self.spec_ax.draw_artist(self.spec_img)
+    def _push_samples(self, audio_data):
+        audio_data = audio_data[-8192:]
+        n = len(audio_data)
+        with self.buffer_lock:
+            first = min(n, 8192 - self.ring_pos)
+            self.ring[self.ring_pos:self.ring_pos + first] = audio_data[:first]
+            self.ring[:n - first] = audio_data[first:]
+            self.ring_pos = (self.ring_pos + n) % 8192
+            self.waveform_dirty = True
+    def render_frame(self):
+        started = time.thread_time()
+        drew = False
+        if self.waveform_dirty and self.waveform_bg is not None:
+            with self.buffer_lock:
+                tail = 8192 - self.ring_pos
+                self.display[:tail] = self.ring[self.ring_pos:]
+                self.display[tail:] = self.ring[:self.ring_pos]
+                self.waveform_dirty = False
+            bins = self.display.reshape(self.display_bins, -1)
+            self.envelope[0::2] = bins.min(axis=1)
+            self.envelope[1::2] = bins.max(axis=1)
+            self.waveform_line.set_ydata(self.envelope)
+            np.maximum(self.envelope, -0.01, out=self.fill_path.vertices[:len(self.envelope), 1])
+            self.waveform_canvas.restore_region(self.waveform_bg)
+            self.waveform_ax.draw_artist(self.waveform_fill)
+            self.waveform_ax.draw_artist(self.waveform_line)
+            self.waveform_canvas.blit(self.waveform_ax.bbox)
+            drew = True
+        spec_data, self.pending_spec = self.pending_spec, None
+        clim = None
+        if self.spec_source is not None and self.spec_source.version != self.spec_version:
+            self.spec_version = self.spec_source.version
+            spec_data, clim = self.spec_source.image(), self.spec_source.clim
+        if spec_data is not None and self.spec_bg is not None:
+            self.spec_img.set_data(spec_data)
+            self.spec_img.set_clim(*(clim or (np.min(spec_data), np.max(spec_data))))
+            self.spec_canvas.restore_region(self.spec_bg)
+            self.spec_ax.draw_artist(self.spec_img)
+            self.spec_canvas.blit(self.spec_ax.bbox)
+            drew = True
+        if drew:
+            cpu = time.thread_time() - started
+            self.frames += 1
+            self.render_cpu += cpu
+            self.total_frames += 1
+            self.total_render_cpu += cpu
+            if self.stats is not None:
+                self.stats.record('render', cpu)
+        elapsed = time.perf_counter() - self.frame_window_start
+        if elapsed >= 1.0:
+            self.measured_fps = self.frames / elapsed
+            self.cpu_per_frame = self.render_cpu / self.frames if self.frames else 0.0
+            self.cpu_load = self.render_cpu / elapsed
+            logger.debug("渲染帧率 %.1f fps，每帧 CPU %.2f ms，CPU 占用 %.1f%%", self.measured_fps, self.cpu_per_frame * 1000, self.cpu_load * 100)
+            self.frames = 0
+            self.render_cpu = 0.0
+            self.frame_window_start = time.perf_counter()
+    def get_render_stats(self):
+        if not self.blit:
+            return {}
+        elapsed = time.perf_counter() - self.render_started
+        return {
+            'fps': self.measured_fps,
+            'cpu_ms_per_frame': self.cpu_per_frame * 1000,
+            'cpu_percent': self.cpu_load * 100,
+            'frames': self.total_frames,
+            'mean_fps': self.total_frames / elapsed if elapsed else 0.0,
+            'mean_cpu_ms_per_frame': self.total_render_cpu / self.total_frames * 1000 if self.total_frames else 0.0,
+            'mean_cpu_percent': self.total_render_cpu / elapsed * 100 if elapsed else 0.0
+        }
 class MainWindow(QMainWindow):
+    key_result = pyqtSignal(object, object)
     def __init__(self):
         super().__init__()
         self.setWindowTitle("键盘声音识别")
@@ -132,12 +279,27 @@ class MainWindow(QMainWindow):
         main_layout.addLayout(top_layout)
         log_group = QGroupBox("日志")
         log_layout = QVBoxLayout(log_group)
-        self.log_text = QTextEdit()
+        self.log_text = QPlainTextEdit()
         self.log_text.setReadOnly(True)
+        self.log_handler = None
         log_layout.addWidget(self.log_text)
         main_layout.addWidget(log_group)
+    def attach_log(self, handler, max_lines=1000, interval_ms=100):
+        self.log_handler = handler
+        self.log_max_lines = max_lines
+        self.log_text.document().setMaximumBlockCount(max_lines)
+        self.log_timer = QTimer(self)
+        self.log_timer.timeout.connect(self.flush_log)
+        self.log_timer.start(interval_ms)
+    def flush_log(self):
+        records = self.log_handler.drain()
+        if records:
+            self.log_text.appendPlainText('\n'.join(self.log_handler.format(record) for record in records[-self.log_max_lines:]))
     def log(self, message):
-        self.log_text.append(message)
+        if self.log_handler is None:
+            self.log_text.appendPlainText(message)
+        else:
+            logger.info(message)
     def update_result(self, key, confidence=None):
         if confidence:
             self.result_label.setText(f"{key} ({confidence:.2f})")